@@ -1,5 +1,10 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils.functional import cached_property
 from .models import *
+from . import deletion
 
 
 admin.AdminSite.site_header = 'Money Transfer API'
@@ -9,37 +14,185 @@ mobile wallets as well as banks across the world using API calls. This API works
 network for all banks.
 '''
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count of an unfiltered changelist from the planner
+    statistics instead of running COUNT(*) over the whole table.
+
+    The statistics are as fresh as the last ANALYZE (autovacuum on PostgreSQL), which is
+    close enough to number the pages of a large table. Filtered or searched changelists,
+    tables without statistics, and tables below ESTIMATE_THRESHOLD rows get an exact count.
+    """
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self.estimate_rows(self.object_list.model)
+            if estimate is not None and estimate > self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate_rows(model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # -1 until the table is first analyzed.
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+                )
+            elif connection.vendor == 'sqlite':
+                # ANALYZE stores "rows [rows per key ...]" per index; sqlite_stat1 is only
+                # created by the first ANALYZE.
+                try:
+                    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                except DatabaseError:
+                    return None
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+            else:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class SoftDeleteAdmin(admin.ModelAdmin):
+    """Deletes through ``soft_delete`` (see deletion.py) instead of cascading in the request."""
+    soft_delete = None
+
+    def delete_model(self, request, obj):
+        self.soft_delete(self.model.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        self.soft_delete(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        # Dependents are removed later by the purge, so there is no cascade to collect and list.
+        return [str(obj) for obj in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+    search_fields = ('name',)
+
+
 @admin.register(BankServer)
-class BankServerAdmin(admin.ModelAdmin):
+class BankServerAdmin(SoftDeleteAdmin):
     list_display = ('name', 'server_ip_address')
     search_fields = ('name', 'server_ip_address')
     list_filter = ('name',)
+    soft_delete = staticmethod(deletion.delete_servers)
 
 
 @admin.register(BankAccount)
-class BankAccountAdmin(admin.ModelAdmin):
-    list_display = ('account_name', 'account_number', 'bank_server')
+class BankAccountAdmin(SoftDeleteAdmin):
+    list_display = ('account_name', 'account_number', 'bank_server', 'tenant')
     search_fields = ('account_name', 'account_number', 'bank_server__name')
     list_filter = ('bank_server',)
+    soft_delete = staticmethod(deletion.delete_accounts)
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
+    """
+    Status changes, creation and deletion go through the API only, which enforces the
+    status transitions, bumps ``version`` and records events (see events.py).
+    """
     list_display = (
-        'transaction_type', 'amount', 'source_account', 
+        'transaction_type', 'amount', 'currency', 'source_account', 
         'target_bank_name', 'target_phone_number', 'provider', 
-        'status', 'created_at'
+        'status', 'risk_score', 'created_at'
     )
     search_fields = (
-        'source_account__account_name', 'target_bank_account_number', 
-        'target_phone_number', 'target_bank_name'
+        'target_bank_account_number', 'target_phone_number', 'target_iban'
+    )
+    search_help_text = 'Prefix of the target account number, phone number or IBAN, or a transaction ID.'
+    list_filter = ('transaction_type', 'status', 'tenant')
+    list_select_related = ('source_account',)
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('status', 'version', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_search_results(self, request, queryset, search_term):
+        """Prefix-match the indexed target columns instead of icontains scans."""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q()
+        for field in self.search_fields:
+            query |= Q(**{f'{field}__startswith': term})
+        if term.isdigit():
+            query |= Q(id=int(term))
+        return queryset.filter(query), False
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'transaction_type', 'amount', 'source_account',
+        'status', 'created_at', 'period'
+    )
+    list_filter = ('period', 'status')
+    list_select_related = ('source_account',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ScheduledTransaction)
+class ScheduledTransactionAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'transaction_type', 'amount', 'currency', 'source_account',
+        'recurrence', 'next_run_at', 'runs', 'last_run_at'
     )
-    list_filter = ('transaction_type', 'status', 'created_at')
-    readonly_fields = ('created_at',)
+    list_filter = ('recurrence', 'tenant')
+    list_select_related = ('source_account',)
+    readonly_fields = ('runs', 'last_run_at', 'last_transaction_id', 'created_at')
+
+
+@admin.register(TransactionEvent)
+class TransactionEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'transaction_id', 'type', 'created_at')
+    list_filter = ('type',)
+    search_fields = ('=transaction_id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'rate', 'updated_at')
+    search_fields = ('currency',)
 
 
 @admin.register(APIKey)
 class APIKeyAdmin(admin.ModelAdmin):
     list_display = [
-        'api_key', 'created_at', 'updated_at'
+        'api_key', 'tenant', 'created_at', 'updated_at'
     ]
\ No newline at end of file
@@ -1,20 +1,81 @@
 from ninja import NinjaAPI, Redoc
-from typing import List
-from .models import BankServer, BankAccount, Transaction
+from ninja.streaming import JSONL
+from ninja.errors import HttpError
+from typing import List, Optional
+from decimal import Decimal
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from .models import BankServer, BankAccount, ScheduledTransaction, Tenant, Transaction, current_tenant
 from .schema import *
+from .limits import check_transfer_limits, velocity
+from . import archive, deletion, events, scheduler
+from .registry import registry
+from .projection import Projection
+from .renderers import NegotiatingRenderer
+from .health import monitor
+from .duplicates import detector
+from .transfers import build_transaction, transfer_details, transfer_fingerprint
+from .fx import fx_rates
+from .risk import risk_engine
+from .tenants import authenticate
 from django.shortcuts import get_object_or_404
 
 from ninja.security import HttpBearer
 
 class ApiKey(HttpBearer):
     def authenticate(self, request, token):
-        if token == "47061d41-7994-4fad-99a7-54879acd9a83":
-            return token
-        return None
+        # request.auth: the caller's tenant scope, see tenants.py.
+        caller = authenticate(token)
+        if caller is not None:
+            # Every default manager only sees this tenant's rows from here on.
+            current_tenant.set(caller.tenant_id)
+        return caller
+
+
+def require_master_key(request):
+    if not request.auth.is_master:
+        raise HttpError(403, "Only the master API key can change bank servers")
     
 
+def save_bank_server(bank_server):
+    """Save a bank server; 409 when another live server has its name or IP address."""
+    try:
+        with db_transaction.atomic():
+            bank_server.save()
+    except IntegrityError:
+        raise HttpError(409, "Another bank server has this name or IP address")
+    return bank_server
+
+
+class MoneyNinjaAPI(NinjaAPI):
+    """NinjaAPI that renders every response in the encoding negotiated with the client."""
+
+    def create_response(self, request, data, *, status=None, temporal_response=None):
+        renderer = self.renderer.select(request)
+        if temporal_response:
+            status = temporal_response.status_code
+        content = renderer.render(request, data, response_status=status)
+        if temporal_response:
+            response = temporal_response
+            response.content = content
+        else:
+            response = HttpResponse(content, status=status, content_type=self.renderer.content_type(renderer))
+        # The encoding depends on Accept, so shared caches have to key on it.
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def create_temporal_response(self, request):
+        return HttpResponse("", content_type=self.renderer.content_type(self.renderer.select(request)))
+
 
-api = NinjaAPI(
+api = MoneyNinjaAPI(
     title="Money API - Server to Server API Transfer - Crypto Flash - USDT, BTC, ETH, e.t.c",
     description="""
     Crypto Flash API Documentation
@@ -43,14 +104,18 @@ api = NinjaAPI(
 
     Transaction Details:
     --------------------
-    - **Currency**: All transaction amounts must be specified in United States Dollars (USD). For example: `99000`.
-    - **Limits**:
+    - **Currency**: Amounts are in United States Dollars (USD) unless a `currency` (ISO 4217 code, e.g. `KES`)
+      is given. Transactions are settled in USD: amounts in other currencies are converted at ingest with the
+      current rate, and `settlement_amount` and `fx_rate` are returned with the transaction.
+    - **Limits** (on the settlement amount):
       - Minimum transaction amount: $100
       - Maximum transaction amount: $200,000,000
 
     Authentication:
     ---------------
     Access to the API is secured through an API key. Include the API key in the header of each request to authenticate.
+    Each API key belongs to a tenant and only sees that tenant's bank accounts and transactions; bank servers
+    are shared, and only the master key can change them.
 
     Example:
     --------
@@ -58,12 +123,21 @@ api = NinjaAPI(
     curl -H "Authorization: your-API-KEY" http://BASE_URL/api/transactions
     ```
 
+    Response Encoding:
+    ------------------
+    - Responses are compressed with `zstd`, `br` or `gzip` according to `Accept-Encoding`.
+    - `Accept: application/vnd.moneyapi.columnar+json` returns lists as columns and rows, with
+      nested objects such as `source_account` sent once and referenced by id.
+    - `Accept: application/msgpack` returns MessagePack.
+
     This API provides a powerful interface for financial institutions, cryptocurrency platforms, and mobile wallet 
     providers to streamline their financial operations globally. For more details on endpoints, request parameters, 
     and response formats, refer to the full API documentation.
     """,
+    version=settings.API_VERSION,
     docs=Redoc(),
-    auth=ApiKey()
+    auth=ApiKey(),
+    renderer=NegotiatingRenderer(),
 )
 
 @api.get("/bank-servers", response=List[BankServerSchema])
@@ -125,12 +199,62 @@ def get_bank_server(request, server_id: int):
     bank_server = get_object_or_404(BankServer, id=server_id)
     return bank_server
 
+@api.get("/bank-servers/{server_id}/health", response=BankServerHealthSchema)
+def get_bank_server_health(request, server_id: int):
+    """
+    Retrieve the live health of a bank server.
+
+    Rolling error rate and latency over recent calls and background probes, and the state
+    of the server's circuit breaker. The breaker is advisory: while it is not `closed`, new
+    transactions for the server are still accepted, as `pending`, with the header
+    `X-Bank-Server-Available: false`. Stats are kept per worker process.
+
+    Args:
+        server_id (int): ID of the bank server.
+
+    Returns:
+        BankServerHealthSchema: Health stats of the bank server.
+
+    Example Response:
+    ```json
+    {
+        "server_id": 1,
+        "state": "closed",
+        "available": true,
+        "error_rate": 0.02,
+        "samples": 100,
+        "latency_p50_ms": 41.7,
+        "latency_p95_ms": 180.2,
+        "consecutive_failures": 0,
+        "last_probe_at": "2024-11-15T10:04:00+00:00",
+        "last_error": null
+    }
+    ```
+    """
+    if registry.server(server_id) is None:
+        raise Http404("No BankServer matches the given query.")
+    available = monitor.is_available(server_id)
+    health = monitor.get(server_id)
+    p50, p95 = health.latency_percentile(0.5), health.latency_percentile(0.95)
+    return {
+        'server_id': server_id,
+        'state': health.state,
+        'available': available,
+        'error_rate': health.error_rate,
+        'samples': len(health.outcomes),
+        'latency_p50_ms': p50 * 1000 if p50 is not None else None,
+        'latency_p95_ms': p95 * 1000 if p95 is not None else None,
+        'consecutive_failures': health.consecutive_failures,
+        'last_probe_at': health.last_probe_at.isoformat() if health.last_probe_at else None,
+        'last_error': health.last_error,
+    }
+
 @api.post("/bank-servers", response=BankServerSchema)
 def create_bank_server(request, payload: BankServerSchema):
     """
     Create a new bank server.
 
-    Add a new bank server to the system with the provided details.
+    Add a new bank server to the system with the provided details. Requires the master API key.
 
     Args:
         payload (BankServerSchema): Details of the new bank server.
@@ -138,6 +262,10 @@ def create_bank_server(request, payload: BankServerSchema):
     Returns:
         BankServerSchema: Details of the created bank server.
 
+    Errors:
+        409: Another bank server has the same name or IP address. Deleted servers do not
+            count, so their name and address can be reused right away.
+
     Example Request:
     ```json
     {
@@ -155,18 +283,18 @@ def create_bank_server(request, payload: BankServerSchema):
     }
     ```
     """
-    bank_server = BankServer.objects.create(
+    require_master_key(request)
+    return save_bank_server(BankServer(
         name=payload.name,
         server_ip_address=payload.server_ip_address,
-    )
-    return bank_server
+    ))
 
 @api.put("/bank-servers/{server_id}", response=BankServerSchema)
 def update_bank_server(request, server_id: int, payload: BankServerSchema):
     """
     Update a bank server.
 
-    Modify the details of an existing bank server by its unique identifier.
+    Modify the details of an existing bank server by its unique identifier. Requires the master API key.
 
     Args:
         server_id (int): ID of the bank server to update.
@@ -175,6 +303,10 @@ def update_bank_server(request, server_id: int, payload: BankServerSchema):
     Returns:
         BankServerSchema: Updated details of the bank server.
 
+    Errors:
+        409: Another bank server has the same name or IP address. Deleted servers do not
+            count, so their name and address can be reused right away.
+
     Example Request:
     ```json
     {
@@ -192,18 +324,21 @@ def update_bank_server(request, server_id: int, payload: BankServerSchema):
     }
     ```
     """
+    require_master_key(request)
     bank_server = get_object_or_404(BankServer, id=server_id)
     bank_server.name = payload.name
     bank_server.server_ip_address = payload.server_ip_address
-    bank_server.save()
-    return bank_server
+    return save_bank_server(bank_server)
 
 @api.delete("/bank-servers/{server_id}", response={204: None})
 def delete_bank_server(request, server_id: int):
     """
     Delete a bank server.
 
-    Remove a bank server from the system by its unique identifier.
+    Remove a bank server from the system by its unique identifier. Requires the master API key.
+
+    The server and its bank accounts are gone right away; they and their transactions are
+    physically removed later by `manage.py purge_deleted`.
 
     Args:
         server_id (int): ID of the bank server to delete.
@@ -211,8 +346,9 @@ def delete_bank_server(request, server_id: int):
     Returns:
         204: Successful deletion.
     """
-    bank_server = get_object_or_404(BankServer, id=server_id)
-    bank_server.delete()
+    require_master_key(request)
+    if not deletion.delete_servers(BankServer.objects.filter(id=server_id)):
+        raise Http404("No BankServer matches the given query.")
     return 204, None
 
 @api.get("/bank-accounts", response=List[BankAccountSchema])
@@ -251,7 +387,7 @@ def list_bank_accounts(request):
     ]
     ```
     """
-    bank_accounts = BankAccount.objects.select_related('bank_server').all()
+    bank_accounts = BankAccount.objects.select_related('bank_server')
     return bank_accounts
 
 @api.get("/bank-accounts/{account_id}", response=BankAccountSchema)
@@ -295,6 +431,7 @@ def create_bank_account(request, payload: BankAccountCreateSchema):
     Create a new bank account.
 
     Add a new bank account to the system with the provided details.
+    The account belongs to the API key's tenant; the master key may pass `tenant`.
 
     Args:
         payload (BankAccountCreateSchema): Details of the new bank account.
@@ -325,8 +462,14 @@ def create_bank_account(request, payload: BankAccountCreateSchema):
     }
     ```
     """
+    tenant_id = request.auth.tenant_id
+    if request.auth.is_master and payload.tenant is not None:
+        tenant_id = get_object_or_404(Tenant, id=payload.tenant).id
+    elif payload.tenant not in (None, tenant_id):
+        raise HttpError(403, "Accounts can only be created for the API key's own tenant")
     bank_server = get_object_or_404(BankServer, id=payload.bank_server)
     bank_account = BankAccount.objects.create(
+        tenant_id=tenant_id,
         bank_server=bank_server,
         account_name=payload.account_name,
         account_number=payload.account_number,
@@ -385,22 +528,33 @@ def delete_bank_account(request, account_id: int):
 
     Remove a bank account from the system by its unique identifier.
 
+    The account is gone right away and its scheduled transactions make no further runs;
+    its transactions stay readable until `manage.py purge_deleted` removes them.
+
     Args:
         account_id (int): ID of the bank account to delete.
 
     Returns:
         204: Successful deletion.
     """
-    bank_account = get_object_or_404(BankAccount, id=account_id)
-    bank_account.delete()
+    if not deletion.delete_accounts(BankAccount.objects.filter(id=account_id)):
+        raise Http404("No BankAccount matches the given query.")
     return 204, None
 
 @api.get("/transactions", response=List[TransactionSchema])
-def list_transactions(request):
+def list_transactions(request, include_archived: bool = True, fields: Optional[str] = None, expand: Optional[str] = None):
     """
     List all transactions.
 
-    Retrieve a list of all transactions that have occurred.
+    Retrieve a list of all transactions that have occurred, including settled transactions
+    that were moved to the archive.
+
+    Args:
+        include_archived (bool): Set to false to only list live (recent) transactions.
+        fields (str): Comma-separated fields to return, e.g. `id,status,amount`. Only these
+            columns are read from the database.
+        expand (str): Nested objects to embed when `fields` or `expand` is given:
+            `source_account` and/or `source_account.bank_server`. Otherwise they are ids.
 
     Returns:
         List[TransactionSchema]: List of transaction details.
@@ -444,25 +598,197 @@ def list_transactions(request):
                 "account_name": "Savings Account",
                 "account_number": "987654321"
             },
-            "target_phone_number": "+1 555-1234",
-            "provider": "CashApp",
+            "target_phone_number": "+254712345678",
+            "provider": "Safaricom",
             "status": "completed"
         }
     ]
     ```
     """
-    transactions = Transaction.objects.select_related('source_account').all()
+    projection = Projection.parse(fields, expand)
+    if projection is not None:
+        rows = archive.list_transactions(include_archived=include_archived, columns=projection.columns())
+        return api.create_response(request, [projection.render(row) for row in rows], status=200)
+    transactions = archive.list_transactions(include_archived=include_archived)
     return [TransactionSchema.from_transaction(t) for t in transactions]
 
+@api.post("/transactions/lookup", response=TransactionLookupResultSchema)
+def lookup_transactions(request, payload: TransactionLookupSchema, fields: Optional[str] = None, expand: Optional[str] = None):
+    """
+    Fetch many transactions by ID.
+
+    Resolve up to `TRANSACTION_LOOKUP_MAX_IDS` transaction IDs in one call, including
+    archived transactions. Results are keyed by ID; IDs that do not exist map to `null`
+    and are also listed in `not_found`.
+
+    Args:
+        payload (TransactionLookupSchema): The IDs to fetch.
+        fields (str): Comma-separated fields to return, see list_transactions.
+        expand (str): Nested objects to embed, see list_transactions.
+
+    Returns:
+        TransactionLookupResultSchema: Transactions by ID and the IDs that were not found.
+
+    Example Request:
+    ```json
+    {
+        "ids": [1, 2, 999]
+    }
+    ```
+
+    Example Response (`?fields=id,status,amount`):
+    ```json
+    {
+        "results": {
+            "1": {"id": 1, "status": "success", "amount": 1000.00},
+            "2": {"id": 2, "status": "pending", "amount": 50.00},
+            "999": null
+        },
+        "not_found": [999]
+    }
+    ```
+    """
+    ids = list(dict.fromkeys(payload.ids))
+    if len(ids) > settings.TRANSACTION_LOOKUP_MAX_IDS:
+        raise HttpError(400, f"At most {settings.TRANSACTION_LOOKUP_MAX_IDS} ids can be looked up at once")
+
+    projection = Projection.parse(fields, expand)
+    found = archive.get_transactions(ids, columns=projection.columns() if projection else None)
+    render = projection.render if projection else TransactionSchema.from_transaction
+    results = {id: render(found[id]) if id in found else None for id in ids}
+    not_found = [id for id in ids if id not in found]
+    if projection is not None:
+        return api.create_response(request, {'results': results, 'not_found': not_found}, status=200)
+    return {'results': results, 'not_found': not_found}
+
+@api.get("/transactions/events", response=JSONL[TransactionEventSchema])
+def replay_transaction_events(request, after: int = 0, limit: int = 1000, transaction_id: Optional[int] = None):
+    """
+    Replay the transaction event log.
+
+    Stream, as JSON lines, the events recorded after the event `after`, oldest first.
+    Every creation, status change and deletion of a transaction appends one event; events
+    are never changed, so a consumer keeps the `id` of the last event it processed and
+    passes it as `after` to catch up incrementally.
+
+    Args:
+        after (int): Only return events with a higher ID (0 for the whole log).
+        limit (int): Maximum number of events, at most TRANSACTION_EVENTS_MAX_LIMIT.
+        transaction_id (int): Only return the events of this transaction.
+
+    Returns:
+        JSONL[TransactionEventSchema]: One event per line.
+
+    Example Response:
+    ```
+    {"id": 41, "transaction_id": 3, "type": "created", "data": {"source_account": 1, "transaction_type": "BANK", "amount": "500.00", "status": "pending", "version": 0}, "created_at": "2024-11-15T10:04:00Z"}
+    {"id": 42, "transaction_id": 3, "type": "status_changed", "data": {"status": "success", "version": 1}, "created_at": "2024-11-15T10:04:09Z"}
+    {"id": 43, "transaction_id": 3, "type": "deleted", "data": {"version": 1}, "created_at": "2024-11-15T10:06:30Z"}
+    ```
+    """
+    if not 0 < limit <= settings.TRANSACTION_EVENTS_MAX_LIMIT:
+        raise HttpError(400, f"limit must be between 1 and {settings.TRANSACTION_EVENTS_MAX_LIMIT}")
+    return events.replay(after=after, limit=limit, transaction_id=transaction_id)
+
+def changes_page(changed, since, limit):
+    """Body of a `/transactions/changes` response for ``events.changes()`` pairs."""
+    found = archive.get_transactions([transaction_id for _, transaction_id in changed])
+    changes = [
+        {
+            'seq': seq,
+            'id': transaction_id,
+            'deleted': transaction_id not in found,
+            'transaction': TransactionSchema.from_transaction(found[transaction_id]) if transaction_id in found else None,
+        }
+        for seq, transaction_id in changed
+    ]
+    return {
+        'changes': changes,
+        'next_since': changed[-1][0] if changed else since,
+        'has_more': len(changed) == limit,
+    }
+
+@api.get("/transactions/changes", response=TransactionChangesSchema)
+async def list_transaction_changes(request, since: int = 0, limit: int = 1000, wait: int = 0):
+    """
+    List transactions changed since a sequence number.
+
+    Every creation, status change and deletion of a transaction bumps the change sequence
+    (the event log ID, see `/transactions/events`). This returns each transaction changed
+    after `since` once, in its current state and in the order of its latest change, so
+    incremental sync costs O(changes) instead of re-downloading `/transactions`. Deleted
+    transactions are returned as tombstones.
+
+    With `wait`, the request is held until a change arrives or `wait` seconds pass
+    (long polling); on timeout `changes` is empty and `next_since` unchanged. The view is
+    async, and so is every middleware of the 'api' deployment profile, so under ASGI a
+    waiting request there holds no worker thread. The 'full' profile includes sync-only
+    middleware (WhiteNoise), which makes Django run the request in a thread.
+
+    Changes are returned TRANSACTION_CHANGES_SETTLE_DELAY seconds after they are made,
+    by when a change with a lower sequence number has normally been committed, so
+    resuming from `next_since` does not skip one. This is best effort: a change whose
+    commit takes longer than the delay can be skipped; clients that cannot miss one
+    should reconcile periodically with `/transactions/events`.
+
+    Args:
+        since (int): Change sequence number from the previous call's `next_since` (0 for all).
+        limit (int): Maximum number of changes, at most TRANSACTION_EVENTS_MAX_LIMIT.
+        wait (int): Seconds to wait for a change when there is none, at most
+            TRANSACTION_CHANGES_MAX_WAIT.
+
+    Returns:
+        TransactionChangesSchema: Changed transactions and the next sequence number.
+
+    Example Response:
+    ```json
+    {
+        "changes": [
+            {"seq": 42, "id": 3, "deleted": false, "transaction": {"id": 3, "status": "success", "version": 1, ...}},
+            {"seq": 43, "id": 2, "deleted": true, "transaction": null}
+        ],
+        "next_since": 43,
+        "has_more": false
+    }
+    ```
+    """
+    if not 0 < limit <= settings.TRANSACTION_EVENTS_MAX_LIMIT:
+        raise HttpError(400, f"limit must be between 1 and {settings.TRANSACTION_EVENTS_MAX_LIMIT}")
+    deadline = time.monotonic() + min(max(wait, 0), settings.TRANSACTION_CHANGES_MAX_WAIT)
+    changed = await sync_to_async(events.changes)(since=since, limit=limit)
+    while not changed and time.monotonic() < deadline:
+        await asyncio.sleep(settings.TRANSACTION_CHANGES_POLL_INTERVAL)
+        # A cheap EXISTS per poll; the grouped query only runs once there is something.
+        if await sync_to_async(events.has_changes)(since=since):
+            changed = await sync_to_async(events.changes)(since=since, limit=limit)
+    return await sync_to_async(changes_page)(changed, since, limit)
+
+def parse_if_match(request):
+    """Return the version in the If-Match header, or None when absent or "*"."""
+    value = request.headers.get('If-Match')
+    if value is None or value.strip() == '*':
+        return None
+    value = value.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HttpError(400, "If-Match must be a transaction version, e.g. \"3\"")
+
+
 @api.get("/transactions/{transaction_id}", response=TransactionSchema)
-def get_transaction(request, transaction_id: int):
+def get_transaction(request, transaction_id: int, response: HttpResponse, fields: Optional[str] = None, expand: Optional[str] = None):
     """
     Retrieve a transaction.
 
-    Get details of a transaction by its unique identifier.
+    Get details of a transaction by its unique identifier. Archived transactions are
+    returned as well. The transaction version is sent in the ETag header.
 
     Args:
         transaction_id (int): ID of the transaction to retrieve.
+        fields (str): Comma-separated fields to return, e.g. `id,status,amount`.
+        expand (str): `source_account` and/or `source_account.bank_server`, see list_transactions.
 
     Returns:
         TransactionSchema: Details of the requested transaction.
@@ -470,6 +796,7 @@ def get_transaction(request, transaction_id: int):
     Example Request:
     ```
     GET /transactions/1
+    GET /transactions/1?fields=id,status,amount
     ```
 
     Example Response:
@@ -498,11 +825,18 @@ def get_transaction(request, transaction_id: int):
     }
     ```
     """
-    transaction = get_object_or_404(Transaction.objects.select_related('source_account'), id=transaction_id)
+    projection = Projection.parse(fields, expand)
+    if projection is not None:
+        row = archive.get_transaction(transaction_id, columns=projection.columns('version'))
+        projected = api.create_response(request, projection.render(row), status=200)
+        projected['ETag'] = f'"{row["version"]}"'
+        return projected
+    transaction = archive.get_transaction(transaction_id)
+    response['ETag'] = f'"{transaction.version}"'
     return TransactionSchema.from_transaction(transaction)
 
 @api.post("/transactions", response=TransactionSchema)
-def create_transaction(request, payload: TransactionCreateSchema):
+def create_transaction(request, payload: TransactionCreateSchema, response: HttpResponse):
     """
     Create a new transaction.
 
@@ -515,14 +849,42 @@ def create_transaction(request, payload: TransactionCreateSchema):
     Returns:
         TransactionSchema: Details of the created transaction.
 
+    If the circuit breaker of the source account's bank server is tripped, the transaction
+    is still accepted and parked in `pending`; the response then carries the header
+    `X-Bank-Server-Available: false` (see `/bank-servers/{server_id}/health`).
+
+    A transaction with the same source account, target and amount as one created in the
+    last DUPLICATE_TRANSACTION_WINDOW seconds is a likely double payout: depending on
+    DUPLICATE_TRANSACTION_POLICY it is rejected with 409, or created with `duplicate_of`
+    set to the earlier transaction.
+
+    `amount` is in `currency` (default USD). It is converted to the settlement currency at
+    ingest, and the limits below apply to the converted `settlement_amount`.
+
+    Every transaction gets a `risk_score` from 0 to 100, rating it against the source
+    account's history (amount, new target, recent velocity, target country). A transaction
+    scoring RISK_REJECT_SCORE or more is created with status `failed`.
+
+    Errors:
+        400: Unsupported currency, or the settlement amount is below MINIMUM_TRANSFER or
+            above MAXIMUM_TRANSFER.
+        409: Duplicate of a recent transaction (DUPLICATE_TRANSACTION_POLICY 'reject'), or
+            of one that is still being created (either policy).
+        422: Invalid target: IBAN length or check digits, SWIFT code structure, a phone
+            number not in international format, or a two-letter `target_country` that
+            does not match the IBAN/phone number. Targets are returned normalized, with
+            `target_country` and `provider` filled in from the phone number when known.
+        429: The source account exceeded one of its hourly/daily velocity limits.
+
     Example Request (Bank Transfer):
     ```json
     {
         "transaction_type": "bank_transfer",
         "amount": 500.00,
+        "currency": "GBP",
         "source_account": 1,
-        "target_iban": "GB0011223344",
-        "target_swift_code": "BANKGB22",
+        "target_iban": "GB82WEST12345698765432",
+        "target_swift_code": "NWBKGB2L",
         "target_bank_account_number": "55667788",
         "target_bank_name": "UK Bank",
         "target_country": "United Kingdom",
@@ -536,6 +898,9 @@ def create_transaction(request, payload: TransactionCreateSchema):
         "id": 3,
         "transaction_type": "bank_transfer",
         "amount": 500.00,
+        "currency": "GBP",
+        "settlement_amount": 635.00,
+        "fx_rate": 1.27,
         "source_account": {
             "id": 1,
             "bank_server": {
@@ -546,8 +911,8 @@ def create_transaction(request, payload: TransactionCreateSchema):
             "account_name": "Checking Account",
             "account_number": "123456789"
         },
-        "target_iban": "GB0011223344",
-        "target_swift_code": "BANKGB22",
+        "target_iban": "GB82WEST12345698765432",
+        "target_swift_code": "NWBKGB2L",
         "target_bank_account_number": "55667788",
         "target_bank_name": "UK Bank",
         "target_country": "United Kingdom",
@@ -562,8 +927,7 @@ def create_transaction(request, payload: TransactionCreateSchema):
         "transaction_type": "mobile_transfer",
         "amount": 50.00,
         "source_account": 2,
-        "target_phone_number": "+1 555-1234",
-        "provider": "CashApp"
+        "target_phone_number": "+254 712 345678"
     }
     ```
 
@@ -583,47 +947,69 @@ def create_transaction(request, payload: TransactionCreateSchema):
             "account_name": "Savings Account",
             "account_number": "987654321"
         },
-        "target_phone_number": "+1 555-1234",
-        "provider": "CashApp",
+        "target_phone_number": "+254712345678",
+        "target_country": "KE",
+        "provider": "Safaricom",
         "status": "pending"
     }
     ```
     """
-    source_account = get_object_or_404(BankAccount, id=payload.source_account)
-
-    transaction = Transaction.objects.create(
-        transaction_type=payload.transaction_type,
-        amount=payload.amount,
-        source_account=source_account,
-        target_iban=payload.target_iban,
-        target_swift_code=payload.target_swift_code,
-        target_bank_account_number=payload.target_bank_account_number,
-        target_bank_name=payload.target_bank_name,
-        target_phone_number=payload.target_phone_number,
-        target_country=payload.target_country,
-        provider=payload.provider,
-        status="pending",
-    )
+    source_account = registry.get_account_or_404(payload.source_account)
+    details = transfer_details(payload)
+    details['amount'] = Decimal(str(payload.amount))
+    details['currency'] = payload.currency or settings.SETTLEMENT_CURRENCY
+    settlement_amount, fx_rate = fx_rates.convert(details['amount'], details['currency'])
+    transaction_fingerprint = transfer_fingerprint(source_account.id, details)
+    duplicate_of = detector.check(transaction_fingerprint)
+    try:
+        check_transfer_limits(source_account.id, settlement_amount)
+        with events.batch():
+            transaction = build_transaction(
+                source_account.id, source_account.tenant_id, details, settlement_amount, fx_rate,
+                fingerprint=transaction_fingerprint,
+                duplicate_of=duplicate_of,
+            )
+            risk_engine.score(transaction)
+            transaction.save()
+            events.transaction_created(transaction)
+            if transaction.status == 'pending':
+                velocity.record(source_account.id, settlement_amount)
+        detector.remember(transaction_fingerprint, transaction.id)
+    finally:
+        detector.release(transaction_fingerprint)
+    if not monitor.is_available(source_account.bank_server_id):
+        response['X-Bank-Server-Available'] = 'false'
     return TransactionSchema.from_transaction(transaction)
 
 @api.put("/transactions/{transaction_id}/status", response=TransactionSchema)
-def update_transaction_status(request, transaction_id: int, payload: TransactionStatusUpdateSchema):
+def update_transaction_status(request, transaction_id: int, payload: TransactionStatusUpdateSchema, response: HttpResponse):
     """
     Update the status of a transaction.
 
-    Modify the status of an existing transaction by its unique identifier.
+    Settle a pending transaction as `success` or `failed`. The change is applied as a
+    single conditional update, so of several concurrent callbacks exactly one wins and
+    the others get 409. Send the ETag of a previous response in `If-Match` to also
+    require that the transaction has not changed since.
 
     Args:
         transaction_id (int): ID of the transaction to update.
         payload (TransactionStatusUpdateSchema): New status for the transaction.
 
     Returns:
-        TransactionSchema: Updated details of the transaction.
+        TransactionSchema: Updated details of the transaction, new version in the ETag header.
+
+    Errors:
+        400: The requested status is not `success` or `failed`.
+        404: Transaction not found.
+        409: The transaction is no longer pending, or its version does not match If-Match.
 
     Example Request:
+    ```
+    If-Match: "0"
+    ```
     ```json
     {
-        "status": "completed"
+        "status": "success"
     }
     ```
 
@@ -643,19 +1029,41 @@ def update_transaction_status(request, transaction_id: int, payload: Transaction
             "account_name": "Checking Account",
             "account_number": "123456789"
         },
-        "target_iban": "GB0011223344",
-        "target_swift_code": "BANKGB22",
+        "target_iban": "GB82WEST12345698765432",
+        "target_swift_code": "NWBKGB2L",
         "target_bank_account_number": "55667788",
         "target_bank_name": "UK Bank",
         "target_country": "United Kingdom",
         "provider": "SWIFT",
-        "status": "completed"
+        "status": "success",
+        "version": 1
     }
     ```
     """
-    transaction = get_object_or_404(Transaction, id=transaction_id)
-    transaction.status = payload.status
-    transaction.save()
+    allowed_from = Transaction.STATUS_TRANSITIONS.get(payload.status)
+    if allowed_from is None:
+        raise HttpError(400, f"Status can only be changed to one of: {', '.join(Transaction.STATUS_TRANSITIONS)}")
+
+    conditions = {'id': transaction_id, 'status__in': allowed_from}
+    expected_version = parse_if_match(request)
+    if expected_version is not None:
+        conditions['version'] = expected_version
+    with events.batch():
+        updated = Transaction.objects.filter(**conditions).update(status=payload.status, version=F('version') + 1)
+        if updated:
+            transaction = Transaction.objects.get(id=transaction_id)
+            events.status_changed(transaction)
+
+    if not updated:
+        current = Transaction.objects.filter(id=transaction_id).values('status', 'version').first()
+        if current is None:
+            raise Http404("No Transaction matches the given query.")
+        raise HttpError(
+            409, f"Transaction is '{current['status']}' at version {current['version']}; "
+                 f"it cannot be changed to '{payload.status}'"
+        )
+
+    response['ETag'] = f'"{transaction.version}"'
     return TransactionSchema.from_transaction(transaction)
 
 @api.delete("/transactions/{transaction_id}", response={204: None})
@@ -663,7 +1071,8 @@ def delete_transaction(request, transaction_id: int):
     """
     Delete a transaction.
 
-    Remove a transaction from the system by its unique identifier.
+    Remove a transaction from the system by its unique identifier. A `deleted` event is
+    appended to the event log, which keeps the transaction's history.
 
     Args:
         transaction_id (int): ID of the transaction to delete.
@@ -671,6 +1080,119 @@ def delete_transaction(request, transaction_id: int):
     Returns:
         204: Successful deletion.
     """
-    transaction = get_object_or_404(Transaction, id=transaction_id)
-    transaction.delete()
-    return 204, None
\ No newline at end of file
+    with events.batch():
+        transaction = get_object_or_404(Transaction.objects.select_for_update(), id=transaction_id)
+        events.transaction_deleted(transaction)
+        transaction.delete()
+    return 204, None
+
+@api.get("/scheduled-transactions", response=List[ScheduledTransactionSchema])
+def list_scheduled_transactions(request):
+    """
+    Get a list of scheduled transactions.
+
+    Returns:
+        List[ScheduledTransactionSchema]: Schedules, including finished ones, oldest first.
+    """
+    schedules = ScheduledTransaction.objects.order_by('id')
+    return [ScheduledTransactionSchema.from_schedule(schedule) for schedule in schedules]
+
+@api.get("/scheduled-transactions/{schedule_id}", response=ScheduledTransactionSchema)
+def get_scheduled_transaction(request, schedule_id: int):
+    """
+    Get a scheduled transaction by ID.
+
+    Args:
+        schedule_id (int): ID of the scheduled transaction.
+
+    Returns:
+        ScheduledTransactionSchema: The schedule, with its next run and the latest transaction it created.
+    """
+    schedule = get_object_or_404(ScheduledTransaction, id=schedule_id)
+    return ScheduledTransactionSchema.from_schedule(schedule)
+
+@api.post("/scheduled-transactions", response=ScheduledTransactionSchema)
+def create_scheduled_transaction(request, payload: ScheduledTransactionCreateSchema):
+    """
+    Schedule a transaction.
+
+    Create a transaction at `starts_at`, or on a recurrence (`daily`, `weekly` or `monthly`)
+    from `starts_at` until `ends_at`. Monthly runs keep the day of month of `starts_at`, or
+    the last day of shorter months.
+
+    Each run creates a regular transaction, listed in `/transactions` and the change feed,
+    with `last_transaction_id` pointing at the latest one. To spread the load of schedules
+    due at the same time, all runs of a schedule happen up to SCHEDULED_TRANSACTION_JITTER
+    seconds after the requested time (see `next_run_at`), never before it. A run over the
+    source account's limits creates a `failed` transaction. Runs missed while the
+    scheduler was down are not repeated: the schedule makes one catch-up run, then
+    continues with its next occurrence.
+
+    Args:
+        payload (ScheduledTransactionCreateSchema): Details of the transfer, as for
+            `POST /transactions`, and when to make it.
+
+    Returns:
+        ScheduledTransactionSchema: The created schedule.
+
+    Errors:
+        400: Unsupported currency, `starts_at` in the past, or `ends_at` before `starts_at`.
+        422: Invalid target or recurrence.
+
+    Example Request (monthly payroll):
+    ```json
+    {
+        "transaction_type": "BANK",
+        "amount": 2500.00,
+        "currency": "GBP",
+        "source_account": 1,
+        "target_iban": "GB82WEST12345698765432",
+        "target_bank_name": "UK Bank",
+        "starts_at": "2025-01-01T09:00:00Z",
+        "recurrence": "monthly"
+    }
+    ```
+    """
+    source_account = registry.get_account_or_404(payload.source_account)
+    details = transfer_details(payload)
+    details['amount'] = Decimal(str(payload.amount))
+    details['currency'] = payload.currency or settings.SETTLEMENT_CURRENCY
+    fx_rates.rate(details['currency'])
+    starts_at = payload.starts_at if timezone.is_aware(payload.starts_at) else timezone.make_aware(payload.starts_at)
+    ends_at = payload.ends_at
+    if ends_at is not None and timezone.is_naive(ends_at):
+        ends_at = timezone.make_aware(ends_at)
+    if starts_at < timezone.now():
+        raise HttpError(400, "starts_at must be in the future")
+    if ends_at is not None and ends_at < starts_at:
+        raise HttpError(400, "ends_at must not be before starts_at")
+
+    schedule = ScheduledTransaction(
+        source_account_id=source_account.id,
+        tenant_id=source_account.tenant_id,
+        recurrence=payload.recurrence,
+        starts_at=starts_at,
+        ends_at=ends_at,
+        jitter=scheduler.new_jitter(),
+        **details,
+    )
+    schedule.next_run_at = scheduler.next_run_at(schedule)
+    schedule.save()
+    return ScheduledTransactionSchema.from_schedule(schedule)
+
+@api.delete("/scheduled-transactions/{schedule_id}", response={204: None})
+def delete_scheduled_transaction(request, schedule_id: int):
+    """
+    Cancel a scheduled transaction.
+
+    No further runs are made; transactions already created by the schedule are kept.
+
+    Args:
+        schedule_id (int): ID of the scheduled transaction.
+
+    Returns:
+        204: Successful deletion.
+    """
+    schedule = get_object_or_404(ScheduledTransaction, id=schedule_id)
+    schedule.delete()
+    return 204, None
@@ -0,0 +1,137 @@
+# archive.py
+"""
+Archival of settled transactions.
+
+Settled (``success``/``failed``) transactions older than ``TRANSACTION_ARCHIVE_AFTER_DAYS``
+are moved in batches from the live ``Transaction`` table into ``ArchivedTransaction``,
+partitioned by month in its ``period`` column. The live table then only holds recent and
+in-flight transactions, and its indexes stay small enough to remain cached.
+
+Reads go through ``get_transaction`` / ``list_transactions`` below, which fall through to
+the archive so callers never need to know where a row lives.
+"""
+import logging
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .models import Transaction, ArchivedTransaction
+
+logger = logging.getLogger(__name__)
+
+# Columns copied verbatim from the live row to the archived row.
+ARCHIVED_FIELDS = [
+    field.attname for field in ArchivedTransaction._meta.concrete_fields
+    if field.name not in ('period', 'archived_at')
+]
+
+
+def get_transaction(transaction_id, columns=None):
+    """
+    Fetch a transaction from the live table, falling back to the archive.
+
+    Args:
+        transaction_id (int): ID of the transaction.
+        columns (list): When given, return a ``values()`` dict of just these columns.
+
+    Raises:
+        Http404: If the transaction is in neither table.
+    """
+    for model in (Transaction, ArchivedTransaction):
+        queryset = model.objects.filter(id=transaction_id)
+        if columns is not None:
+            queryset = queryset.values(*columns)
+        transaction = queryset.first()
+        if transaction is not None:
+            return transaction
+    raise Http404("No Transaction matches the given query.")
+
+
+def get_transactions(transaction_ids, columns=None):
+    """
+    Fetch many transactions with one ``id__in`` query per table.
+
+    Only ids missing from the live table are looked up in the archive.
+
+    Returns:
+        dict: Transaction (or ``values()`` dict when ``columns`` is given) by id;
+        unknown ids are absent.
+    """
+    found = {}
+    missing = list(transaction_ids)
+    for model in (Transaction, ArchivedTransaction):
+        if not missing:
+            break
+        queryset = model.objects.filter(id__in=missing)
+        if columns is not None:
+            for row in queryset.values(*columns):
+                found[row['id']] = row
+        else:
+            for transaction in queryset:
+                found[transaction.id] = transaction
+        missing = [id for id in missing if id not in found]
+    return found
+
+
+def list_transactions(include_archived=True, columns=None):
+    """Iterate over archived (oldest first) and then live transactions."""
+    live = Transaction.objects.order_by('id')
+    archived = ArchivedTransaction.objects.order_by('id')
+    if columns is not None:
+        live, archived = live.values(*columns), archived.values(*columns)
+    if not include_archived:
+        return live
+    return chain(archived.iterator(), live)
+
+
+def archive_settled_transactions(older_than_days=None, batch_size=None):
+    """
+    Move settled transactions older than the cutoff into the archive.
+
+    Each batch is copied and deleted inside one DB transaction, so a row is always in
+    exactly one of the two tables. A live row whose id is already taken in the archive is
+    left in place and logged, never deleted.
+
+    Args:
+        older_than_days (int): Age cutoff, defaults to TRANSACTION_ARCHIVE_AFTER_DAYS.
+        batch_size (int): Rows per batch, defaults to TRANSACTION_ARCHIVE_BATCH_SIZE.
+
+    Returns:
+        int: Number of archived transactions.
+    """
+    if older_than_days is None:
+        older_than_days = settings.TRANSACTION_ARCHIVE_AFTER_DAYS
+    if batch_size is None:
+        batch_size = settings.TRANSACTION_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    settled = Transaction.all_objects.filter(
+        status__in=Transaction.SETTLED_STATUSES, created_at__lt=cutoff
+    ).order_by('id')
+
+    archived = last_id = 0
+    while True:
+        with db_transaction.atomic():
+            batch = list(settled.filter(id__gt=last_id).select_for_update()[:batch_size])
+            if not batch:
+                return archived
+            last_id = batch[-1].id
+            taken = set(
+                ArchivedTransaction.all_objects.filter(id__in=[transaction.id for transaction in batch])
+                .values_list('id', flat=True)
+            )
+            if taken:
+                logger.error("Not archiving transactions whose ids are already archived: %s", sorted(taken))
+                batch = [transaction for transaction in batch if transaction.id not in taken]
+            ArchivedTransaction.all_objects.bulk_create([
+                ArchivedTransaction(
+                    period=transaction.created_at.strftime('%Y-%m'),
+                    **{name: getattr(transaction, name) for name in ARCHIVED_FIELDS},
+                )
+                for transaction in batch
+            ])
+            Transaction.all_objects.filter(id__in=[transaction.id for transaction in batch]).delete()
+        archived += len(batch)
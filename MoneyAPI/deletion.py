@@ -0,0 +1,124 @@
+# deletion.py
+"""
+Soft delete of bank servers and bank accounts, and the purge that removes them later.
+
+Deleting a server or account through the API or the admin only sets ``deleted_at``,
+with a few single-statement UPDATEs, so the request returns right away however many
+transactions hang off it:
+
+- ``objects`` on both models leaves soft-deleted rows out, so they disappear from every
+  endpoint and the admin at once; ``all_objects`` still sees them. Other processes
+  reject new transactions and schedules for them at once (``get_account_or_404`` reads
+  the database) and drop them from their registry on its next reload, within
+  ``REGISTRY_TTL`` seconds.
+- Deleting a server deletes its accounts too.
+- The scheduled transactions of a deleted account are finished, so the scheduler makes
+  no further runs for it.
+
+The existing transactions of a deleted account stay readable until they are purged.
+
+``manage.py purge_deleted`` runs ``purge_deleted()``, which physically removes what was
+soft-deleted more than ``DELETED_PURGE_AFTER_DAYS`` ago. The cascade is done by hand in
+chunks of ``DELETED_PURGE_BATCH_SIZE`` rows, each in its own DB transaction, so no single
+statement or lock covers more than one chunk. Every purged transaction gets a
+``deleted`` event (see events.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from . import events
+from .models import ArchivedTransaction, BankAccount, BankServer, ScheduledTransaction, Transaction, TransactionEvent
+from .registry import registry
+
+
+def delete_accounts(accounts):
+    """Soft-delete a BankAccount queryset. Returns the number of accounts deleted."""
+    with db_transaction.atomic():
+        account_ids = list(accounts.filter(deleted_at__isnull=True).values_list('id', flat=True))
+        if not account_ids:
+            return 0
+        BankAccount.objects.filter(id__in=account_ids).update(deleted_at=timezone.now())
+        ScheduledTransaction.objects.filter(
+            source_account_id__in=account_ids, next_run_at__isnull=False
+        ).update(next_run_at=None)
+    db_transaction.on_commit(registry.invalidate)
+    return len(account_ids)
+
+
+def delete_servers(servers):
+    """Soft-delete a BankServer queryset and its accounts. Returns the number of servers deleted."""
+    with db_transaction.atomic():
+        server_ids = list(servers.filter(deleted_at__isnull=True).values_list('id', flat=True))
+        if not server_ids:
+            return 0
+        BankServer.objects.filter(id__in=server_ids).update(deleted_at=timezone.now())
+        delete_accounts(BankAccount.objects.filter(bank_server_id__in=server_ids))
+    db_transaction.on_commit(registry.invalidate)
+    return len(server_ids)
+
+
+def _purge_transactions(account_id, batch_size):
+    """Delete the live and archived transactions of an account, one chunk per DB transaction."""
+    purged = 0
+    while True:
+        with events.batch():
+            rows = list(
+                Transaction.all_objects.filter(source_account_id=account_id)
+                .order_by('id')
+                .values_list('id', 'tenant_id', 'version')[:batch_size]
+            )
+            for id, tenant_id, version in rows:
+                events.record(id, tenant_id, TransactionEvent.DELETED, {'version': version})
+            Transaction.all_objects.filter(id__in=[row[0] for row in rows]).delete()
+        purged += len(rows)
+        if len(rows) < batch_size:
+            break
+    while True:
+        with events.batch():
+            rows = list(
+                ArchivedTransaction.all_objects.filter(source_account_id=account_id)
+                .order_by('id')
+                .values_list('id', 'tenant_id', 'version')[:batch_size]
+            )
+            for id, tenant_id, version in rows:
+                events.record(id, tenant_id, TransactionEvent.DELETED, {'version': version})
+            ArchivedTransaction.all_objects.filter(id__in=[row[0] for row in rows]).delete()
+        purged += len(rows)
+        if len(rows) < batch_size:
+            return purged
+
+
+def purge_deleted(older_than_days=None, batch_size=None):
+    """
+    Physically remove servers and accounts soft-deleted before the cutoff.
+
+    Args:
+        older_than_days (int): Age cutoff, defaults to DELETED_PURGE_AFTER_DAYS.
+        batch_size (int): Rows per chunk, defaults to DELETED_PURGE_BATCH_SIZE.
+
+    Returns:
+        tuple: Numbers of purged ``(servers, accounts, transactions)``; archived
+        transactions are counted as transactions.
+    """
+    if older_than_days is None:
+        older_than_days = settings.DELETED_PURGE_AFTER_DAYS
+    if batch_size is None:
+        batch_size = settings.DELETED_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    accounts = transactions = 0
+    account_ids = BankAccount.all_objects.filter(deleted_at__lt=cutoff).values_list('id', flat=True)
+    for account_id in list(account_ids.order_by('id')):
+        transactions += _purge_transactions(account_id, batch_size)
+        # Only small dependents are left (schedules, velocity), so the cascade is cheap now.
+        with db_transaction.atomic():
+            BankAccount.all_objects.filter(id=account_id).delete()
+        accounts += 1
+
+    # A server goes once all of its accounts have, which is not yet the case when one
+    # of them was deleted after the cutoff.
+    servers, _ = BankServer.all_objects.filter(deleted_at__lt=cutoff, bankaccount__isnull=True).delete()
+    return servers, accounts, transactions
@@ -0,0 +1,129 @@
+# duplicates.py
+"""
+Near-duplicate detection for incoming transactions.
+
+A transaction's fingerprint is a hash of its source account, target (IBAN, bank account
+number or phone number, normalized), amount and currency. A new transaction whose fingerprint was
+already seen within ``DUPLICATE_TRANSACTION_WINDOW`` seconds is a likely double payout,
+and is handled according to ``DUPLICATE_TRANSACTION_POLICY``:
+
+- ``'reject'``: ``create_transaction`` answers 409 with the earlier transaction's id.
+- ``'flag'``: the transaction is created with ``duplicate_of`` set to the earlier id.
+
+Each process keeps the fingerprints of the window in memory, so a repeat through the
+same worker is caught without a query. Otherwise one lookup on the
+``(fingerprint, created_at)`` index catches repeats that went through another worker.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from .models import Transaction
+
+CENT = Decimal('0.01')
+
+
+class DuplicateTransaction(HttpError):
+    """Raised for a duplicate transaction under the 'reject' policy."""
+
+
+def _normalize(value):
+    return ''.join(value.split()).upper() if value else ''
+
+
+def fingerprint(source_account_id, amount, currency, target_iban=None, target_bank_account_number=None,
+                target_phone_number=None):
+    """Hex fingerprint of a transfer; ``amount`` is a Decimal in ``currency``."""
+    target = (
+        _normalize(target_iban) or _normalize(target_bank_account_number)
+        or _normalize(target_phone_number).lstrip('+')
+    )
+    key = f"{source_account_id}|{target}|{amount.quantize(CENT)}|{currency}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+class DuplicateDetector:
+    """Fingerprints of this process's recent transactions, oldest first."""
+
+    def __init__(self):
+        self._recent = {}   # fingerprint -> (monotonic time, transaction id or None while being created)
+        self._lock = threading.Lock()
+
+    def _prune(self, now, window):
+        while self._recent:
+            oldest = next(iter(self._recent))
+            if now - self._recent[oldest][0] < window:
+                break
+            del self._recent[oldest]
+
+    def check(self, fingerprint):
+        """
+        Look for an earlier transaction with this fingerprint and reserve the fingerprint.
+
+        A repeat of a transaction that is still being created in this process has no id to
+        flag yet, so it is answered with 409 under both policies. The caller must
+        ``release()`` the fingerprint once it is done, whether or not the transaction was
+        created; ``check()`` releases it itself when it raises.
+
+        Returns:
+            int: ID of the earlier transaction when flagged, None when there is none.
+
+        Raises:
+            DuplicateTransaction: 409 under the 'reject' policy, or for an in-flight repeat.
+        """
+        window = settings.DUPLICATE_TRANSACTION_WINDOW
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now, window)
+            seen = self._recent.get(fingerprint)
+            if seen is None:
+                # Reserve it, so a concurrent repeat in this process is caught too.
+                self._recent[fingerprint] = (now, None)
+        if seen is not None:
+            duplicate_of = seen[1]
+            if duplicate_of is None:
+                raise DuplicateTransaction(409, "Duplicate of a transaction that is being created")
+        else:
+            try:
+                duplicate_of = (
+                    Transaction.objects.filter(
+                        fingerprint=fingerprint, created_at__gte=timezone.now() - timedelta(seconds=window)
+                    )
+                    .order_by('-created_at')
+                    .values_list('id', flat=True)
+                    .first()
+                )
+            except BaseException:
+                self.release(fingerprint)
+                raise
+            if duplicate_of is None:
+                return None
+        if settings.DUPLICATE_TRANSACTION_POLICY == 'reject':
+            if seen is None:
+                self.remember(fingerprint, duplicate_of)
+            raise DuplicateTransaction(
+                409, f"Duplicate of a transaction created in the last {window} seconds (transaction {duplicate_of})"
+            )
+        return duplicate_of
+
+    def remember(self, fingerprint, transaction_id):
+        """Record the transaction created for a reserved fingerprint."""
+        with self._lock:
+            self._recent.pop(fingerprint, None)
+            self._recent[fingerprint] = (time.monotonic(), transaction_id)
+
+    def release(self, fingerprint):
+        """Drop the reservation of a fingerprint, if its transaction was not remembered."""
+        with self._lock:
+            seen = self._recent.get(fingerprint)
+            if seen is not None and seen[1] is None:
+                del self._recent[fingerprint]
+
+
+detector = DuplicateDetector()
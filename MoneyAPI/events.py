@@ -0,0 +1,144 @@
+# events.py
+"""
+Append-only transaction event log.
+
+Every change to a transaction (creation, status change, deletion) appends a
+``TransactionEvent``. Events are never updated or deleted, so the log is the history
+of every transaction, including deleted and archived ones, and its ids are a sequence
+that consumers can checkpoint: replaying ``id > checkpoint`` catches up incrementally
+without scanning the ``Transaction`` table.
+
+Writes go through ``batch()``: an atomic block in which ``record()`` only buffers the
+events, which are then written with one bulk INSERT inside the same DB transaction,
+so an event exists if and only if its change was committed.
+
+Note that ids are allocated at insert time, so on databases with concurrent writers an
+event may become visible after an event with a higher id; consumers of ``replay()``
+that need every event should re-read a short tail behind their checkpoint. ``changes()``
+does that for its callers: it leaves out events younger than
+``TRANSACTION_CHANGES_SETTLE_DELAY`` seconds. Events are inserted as the last statement
+before their DB transaction commits, so by then every event with a lower id is normally
+visible too. This is best effort: the cutoff is wall-clock time, so an event whose
+commit takes longer than the delay, or stamped by an app server whose clock is behind,
+can still appear behind a checkpoint already handed out, and is then skipped by
+``changes()``. Consumers that cannot miss one should reconcile with ``replay()``.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Transaction, TransactionEvent
+
+_local = threading.local()
+
+# Fields of a new transaction copied into its "created" event.
+SNAPSHOT_FIELDS = (
+    'transaction_type', 'amount', 'currency', 'settlement_amount', 'fx_rate', 'target_iban', 'target_swift_code', 'target_bank_account_number',
+    'target_bank_name', 'target_phone_number', 'target_country', 'provider', 'status', 'version',
+    'duplicate_of', 'risk_score',
+)
+
+
+@contextmanager
+def batch():
+    """Atomic block whose recorded events are bulk-inserted just before it commits."""
+    if getattr(_local, 'buffer', None) is not None:
+        # Nested: the outer batch writes the events.
+        with db_transaction.atomic():
+            yield
+        return
+    with db_transaction.atomic():
+        _local.buffer = []
+        try:
+            yield
+            events = _local.buffer
+        finally:
+            _local.buffer = None
+        TransactionEvent.objects.bulk_create(events)
+
+
+def record(transaction_id, tenant_id, type, data):
+    """Append an event; buffered when inside ``batch()``, written right away otherwise."""
+    event = TransactionEvent(transaction_id=transaction_id, tenant_id=tenant_id, type=type, data=data)
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        event.save()
+    else:
+        buffer.append(event)
+
+
+def transaction_created(transaction: Transaction):
+    data = {'source_account': transaction.source_account_id}
+    for name in SNAPSHOT_FIELDS:
+        value = getattr(transaction, name)
+        if value is not None:
+            data[name] = value
+    record(transaction.id, transaction.tenant_id, TransactionEvent.CREATED, data)
+
+
+def status_changed(transaction):
+    data = {'status': transaction.status, 'version': transaction.version}
+    record(transaction.id, transaction.tenant_id, TransactionEvent.STATUS_CHANGED, data)
+
+
+def transaction_deleted(transaction):
+    record(transaction.id, transaction.tenant_id, TransactionEvent.DELETED, {'version': transaction.version})
+
+
+def replay(after=0, limit=1000, transaction_id=None):
+    """
+    Events with an id above ``after`` in id order, as an iterator of plain dicts.
+
+    The query is built right away, in the current tenant scope (see tenants.py), and only
+    run when the iterator is consumed, e.g. while a response streams.
+    """
+    queryset = TransactionEvent.objects.filter(id__gt=after)
+    if transaction_id is not None:
+        queryset = queryset.filter(transaction_id=transaction_id)
+    names = dict(TransactionEvent.EVENT_TYPES)
+    rows = queryset.order_by('id').values_list('id', 'transaction_id', 'type', 'data', 'created_at')[:limit]
+    return (
+        {
+            'id': id,
+            'transaction_id': transaction_id,
+            'type': names[type],
+            'data': data,
+            'created_at': created_at,
+        }
+        for id, transaction_id, type, data, created_at in rows.iterator(chunk_size=500)
+    )
+
+
+def _settled(since):
+    """Events after ``since`` older than the settle delay, by when lower ids have normally committed."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TRANSACTION_CHANGES_SETTLE_DELAY)
+    return TransactionEvent.objects.filter(id__gt=since, created_at__lt=cutoff)
+
+
+def has_changes(since=0):
+    """Whether ``changes(since)`` would return anything; one indexed EXISTS, for polling."""
+    return _settled(since).exists()
+
+
+def changes(since=0, limit=1000):
+    """
+    Transactions changed after the event ``since``, as ``(seq, transaction_id)`` pairs.
+
+    ``seq`` is the id of the transaction's latest settled event, so every transaction
+    appears once however often it changed, in the order of its last change. Returns at
+    most ``limit`` pairs; the last ``seq`` is the checkpoint for the next call, which
+    is only as safe as the settle delay (see the module docstring).
+    """
+    rows = (
+        _settled(since)
+        .values('transaction_id')
+        .annotate(seq=Max('id'))
+        .order_by('seq')
+        .values_list('seq', 'transaction_id')
+    )
+    return list(rows[:limit])
@@ -0,0 +1,87 @@
+# fx.py
+"""
+Currency conversion into the settlement currency.
+
+Transactions may be sent in any currency with a rate in the ``FxRate`` table. At ingest
+the amount is converted to ``SETTLEMENT_CURRENCY`` with Decimal arithmetic (rounded half
+to even, to the cent), and both the settlement amount and the rate used are stored with
+the transaction.
+
+Rates are read from an immutable in-memory snapshot, never from the database per
+request. The snapshot is rebuilt with one query every ``FX_RATES_TTL`` seconds, or right
+away after an ``FxRate`` is saved in this process (see ``signals.py``), and swapped in
+with a single assignment, so a conversion always sees one consistent set of rates.
+"""
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from django.conf import settings
+from ninja.errors import HttpError
+
+from .models import FxRate
+
+CENT = Decimal('0.01')
+ONE = Decimal(1)
+
+
+class UnknownCurrency(HttpError):
+    """Raised for a currency without a rate to the settlement currency."""
+
+
+class RateSnapshot:
+    """Rates to the settlement currency at one point in time."""
+    __slots__ = ('rates', 'loaded_at')
+
+    def __init__(self, rates, loaded_at):
+        self.rates = rates
+        self.loaded_at = loaded_at
+
+
+class FxRates:
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > settings.FX_RATES_TTL:
+            snapshot = self.reload()
+        return snapshot
+
+    def reload(self):
+        """Load all rates with one query and swap in the new snapshot."""
+        with self._lock:
+            rates = dict(FxRate.objects.values_list('currency', 'rate'))
+            rates[settings.SETTLEMENT_CURRENCY] = ONE
+            self._snapshot = RateSnapshot(rates, time.monotonic())
+            return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def rate(self, currency, snapshot=None):
+        """
+        Rate from ``currency`` to the settlement currency.
+
+        Raises:
+            UnknownCurrency: 400 when there is no rate for the currency.
+        """
+        rate = (snapshot or self.snapshot).rates.get(currency)
+        if rate is None:
+            raise UnknownCurrency(400, f"Unsupported currency '{currency}'")
+        return rate
+
+    def convert(self, amount, currency, snapshot=None):
+        """
+        Return ``(settlement_amount, rate)`` for a Decimal amount in ``currency``.
+
+        Pass the same ``snapshot`` for every row of a batch to convert it against one set
+        of rates (see scheduler.py).
+        """
+        rate = self.rate(currency, snapshot)
+        return (amount * rate).quantize(CENT, rounding=ROUND_HALF_EVEN), rate
+
+
+fx_rates = FxRates()
@@ -0,0 +1,160 @@
+# health.py
+"""
+Health tracking and circuit breakers per BankServer.
+
+Every call to a bank server (and every background probe) is recorded with ``record()``.
+Each server keeps a rolling window of outcomes and latencies, from which its breaker moves
+between the usual states:
+
+- ``closed``: the server is healthy.
+- ``open``: the error rate over the window, or the run of consecutive failures, crossed
+  its threshold.
+- ``half_open``: the cooldown has passed; the next call or probe decides: success closes
+  the breaker, failure opens it again.
+
+The breaker is advisory: nothing in this service dispatches transactions to bank servers,
+so it gates no calls. ``create_transaction`` still accepts transactions for a server whose
+breaker is not closed, leaves them ``pending`` and says so in the
+``X-Bank-Server-Available: false`` header; ``GET /bank-servers/{id}/health`` shows the state.
+
+A daemon thread per process probes every server's ``server_ip_address`` with a TCP
+connect every ``probe_interval`` seconds, so a recovered server is noticed even when
+no traffic is going to it.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class ServerHealth:
+    """Rolling stats and breaker state of one BankServer."""
+    __slots__ = (
+        'server_id', 'state', 'outcomes', 'latencies', 'consecutive_failures',
+        'opened_at', 'last_probe_at', 'last_error',
+    )
+
+    def __init__(self, server_id, window):
+        self.server_id = server_id
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)     # True for success
+        self.latencies = deque(maxlen=window)    # Seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_probe_at = None
+        self.last_error = None
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency_percentile(self, percentile):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * percentile), len(ordered) - 1)]
+
+
+class HealthMonitor:
+    def __init__(self):
+        self._servers = {}
+        self._lock = threading.Lock()
+        self._probe_pid = None
+
+    @property
+    def config(self):
+        return settings.BANK_SERVER_HEALTH
+
+    def get(self, server_id):
+        health = self._servers.get(server_id)
+        if health is None:
+            with self._lock:
+                health = self._servers.setdefault(server_id, ServerHealth(server_id, self.config['window']))
+        self.ensure_probing()
+        return health
+
+    def _refresh(self, health, now):
+        if health.state == OPEN and now - health.opened_at >= self.config['cooldown']:
+            health.state = HALF_OPEN
+
+    def is_available(self, server_id):
+        """Whether the server's breaker is closed."""
+        health = self.get(server_id)
+        with self._lock:
+            self._refresh(health, time.monotonic())
+            return health.state == CLOSED
+
+    def record(self, server_id, ok, latency, error=None):
+        """Record the outcome of a call or probe and update the breaker."""
+        config = self.config
+        health = self.get(server_id)
+        ok = ok and latency * 1000 < config['slow_call_ms']
+        now = time.monotonic()
+        with self._lock:
+            health.outcomes.append(ok)
+            health.latencies.append(latency)
+            if ok:
+                health.consecutive_failures = 0
+                if health.state == HALF_OPEN:
+                    health.state = CLOSED
+                    health.outcomes.clear()
+                return
+            health.consecutive_failures += 1
+            health.last_error = error or 'slow response'
+            tripped = health.consecutive_failures >= config['consecutive_failures'] or (
+                len(health.outcomes) >= config['min_calls'] and health.error_rate >= config['error_rate']
+            )
+            if health.state == HALF_OPEN or (health.state == CLOSED and tripped):
+                health.state = OPEN
+                health.opened_at = now
+
+    def probe(self, server):
+        started = time.monotonic()
+        try:
+            with socket.create_connection(
+                (server.server_ip_address, self.config['probe_port']), timeout=self.config['probe_timeout']
+            ):
+                pass
+        except OSError as exc:
+            self.record(server.id, False, time.monotonic() - started, error=str(exc))
+        else:
+            self.record(server.id, True, time.monotonic() - started)
+        self.get(server.id).last_probe_at = datetime.now(timezone.utc)
+
+    def ensure_probing(self):
+        """Start the probe thread once per process (again after a fork)."""
+        if self._probe_pid == os.getpid() or not self.config['probe_interval']:
+            return
+        with self._lock:
+            if self._probe_pid == os.getpid():
+                return
+            self._probe_pid = os.getpid()
+        threading.Thread(target=self._probe_loop, name='bank-server-probes', daemon=True).start()
+
+    def _probe_loop(self):
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix='bank-server-probe') as pool:
+            while True:
+                close_old_connections()
+                try:
+                    list(pool.map(self.probe, registry.servers()))
+                except Exception:
+                    logger.exception("Bank server probe round failed")
+                time.sleep(self.config['probe_interval'])
+
+
+monitor = HealthMonitor()
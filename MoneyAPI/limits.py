@@ -0,0 +1,180 @@
+# limits.py
+"""
+Transfer limits for incoming transactions.
+
+Two kinds of limits are enforced by ``create_transaction``:
+
+- The flat ``MINIMUM_TRANSFER`` / ``MAXIMUM_TRANSFER`` bounds from settings.
+- Rolling per-account velocity limits (total amount and number of transfers per
+  window, see ``VELOCITY_LIMITS``).
+
+Velocity is tracked in process-local sliding-window counters, so checking a limit
+never runs an aggregate query. Checking a transfer does not count it: the caller
+records it once it is created, and ``record()`` only counts it when the DB transaction
+creating it commits, so rejected, failed or rolled-back transfers use no budget.
+Transfers that are checked but not committed yet are not seen by other checks, so a
+burst of concurrent transfers can overshoot a limit by the transfers in flight.
+
+A process's counts are merged into the ``AccountVelocity`` table on the first commit
+``VELOCITY_SYNC_INTERVAL`` seconds after the last merge, and at exit; an account's
+counters are re-read when checked if they are older than that (see snapshots.py). So a
+worker sees another worker's traffic after about two intervals, or once that worker
+records again when it went idle in between.
+"""
+import time
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from ninja.errors import HttpError
+
+from .models import AccountVelocity
+from .snapshots import AccountSnapshots
+
+BUCKETS_PER_WINDOW = 60
+
+
+class LimitExceeded(HttpError):
+    """Raised when a transfer falls outside the configured limits."""
+
+
+class SlidingWindow:
+    """Amount and count of transfers over the last ``seconds``, kept in fixed buckets."""
+    __slots__ = ('seconds', 'width', 'stamps', 'amounts', 'counts')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.width = max(seconds // BUCKETS_PER_WINDOW, 1)
+        self.stamps = [-1] * BUCKETS_PER_WINDOW
+        self.amounts = [Decimal(0)] * BUCKETS_PER_WINDOW
+        self.counts = [0] * BUCKETS_PER_WINDOW
+
+    def add(self, now, amount, count=1):
+        stamp = int(now // self.width)
+        slot = stamp % BUCKETS_PER_WINDOW
+        if self.stamps[slot] != stamp:
+            self.stamps[slot] = stamp
+            self.amounts[slot] = Decimal(0)
+            self.counts[slot] = 0
+        self.amounts[slot] += amount
+        self.counts[slot] += count
+
+    def totals(self, now):
+        oldest = int(now // self.width) - BUCKETS_PER_WINDOW
+        amount, count = Decimal(0), 0
+        for slot, stamp in enumerate(self.stamps):
+            if stamp > oldest:
+                amount += self.amounts[slot]
+                count += self.counts[slot]
+        return amount, count
+
+    def dump(self):
+        return [
+            [stamp, str(self.amounts[slot]), self.counts[slot]]
+            for slot, stamp in enumerate(self.stamps) if stamp >= 0
+        ]
+
+    def load(self, buckets, now):
+        oldest = int(now // self.width) - BUCKETS_PER_WINDOW
+        for stamp, amount, count in buckets:
+            if stamp > oldest:
+                self.add(stamp * self.width, Decimal(amount), count)
+
+
+class AccountWindows:
+    """All velocity windows of one account."""
+    __slots__ = ('windows',)
+
+    def __init__(self, limits):
+        self.windows = {name: SlidingWindow(limit['seconds']) for name, limit in limits.items()}
+
+    def observe(self, now, amount):
+        for window in self.windows.values():
+            window.add(now, amount)
+
+    def dump(self):
+        return {name: window.dump() for name, window in self.windows.items()}
+
+    def load(self, data, now):
+        for name, buckets in (data or {}).items():
+            if name in self.windows:
+                self.windows[name].load(buckets, now)
+
+
+class VelocityTracker:
+    """Per-account ``AccountWindows``, synced to ``AccountVelocity``."""
+
+    def __init__(self, limits=None, sync_interval=None):
+        self.limits = limits if limits is not None else settings.VELOCITY_LIMITS
+        self.snapshots = AccountSnapshots(
+            AccountVelocity, 'windows', partial(AccountWindows, self.limits),
+            sync_interval if sync_interval is not None else settings.VELOCITY_SYNC_INTERVAL,
+        )
+
+    def check(self, account_id, amount, now=None, reserved=None):
+        """
+        Reject the transfer if it would exceed a velocity limit. It is not counted; see ``record()``.
+
+        Args:
+            reserved (dict): For batches, account id -> ``(amount, count)`` of the transfers
+                already checked in the same DB transaction. They count against the limits,
+                and the transfer is added to them when it passes.
+
+        Raises:
+            LimitExceeded: 429 naming the window that would be exceeded.
+        """
+        if not self.limits:
+            return
+        now = time.time() if now is None else now
+        self.snapshots.load([account_id], now)
+        earlier_amount, earlier_count = (reserved or {}).get(account_id, (0, 0))
+
+        with self.snapshots.lock:
+            windows = self.snapshots.get(account_id).windows
+            for name, limit in self.limits.items():
+                total, count = windows[name].totals(now)
+                if limit.get('count') is not None and count + earlier_count + 1 > limit['count']:
+                    raise LimitExceeded(429, f"Transfer count limit per {name} exceeded for this account")
+                if limit.get('amount') is not None and total + earlier_amount + amount > limit['amount']:
+                    raise LimitExceeded(429, f"Transfer amount limit per {name} exceeded for this account")
+        if reserved is not None:
+            reserved[account_id] = (earlier_amount + amount, earlier_count + 1)
+
+    def record(self, account_id, amount):
+        """Count a transfer once the DB transaction creating it commits; not at all if it rolls back."""
+        if self.limits:
+            self.snapshots.observe(account_id, time.time(), amount)
+
+    def totals(self, account_id, name, now=None):
+        """``(amount, count)`` of the account's transfers in window ``name``, None without that window."""
+        if name not in self.limits:
+            return None
+        now = time.time() if now is None else now
+        self.snapshots.load([account_id], now)
+        with self.snapshots.lock:
+            return self.snapshots.get(account_id).windows[name].totals(now)
+
+
+velocity = VelocityTracker()
+
+
+def check_transfer_limits(account_id, amount, reserved=None):
+    """
+    Enforce ``MINIMUM_TRANSFER``, ``MAXIMUM_TRANSFER`` and the velocity limits.
+
+    The transfer is not counted against the velocity limits; call ``velocity.record()``
+    once it is created as ``pending``.
+
+    Args:
+        account_id (int): ID of the source BankAccount.
+        amount (Decimal): Transfer amount in SETTLEMENT_CURRENCY (see fx.py).
+        reserved (dict): Transfers already checked in the same batch, see ``VelocityTracker.check``.
+
+    Raises:
+        LimitExceeded: 400 when the amount is out of bounds, 429 on velocity limits.
+    """
+    if amount < settings.MINIMUM_TRANSFER:
+        raise LimitExceeded(400, f"Minimum transaction amount is {settings.MINIMUM_TRANSFER} {settings.SETTLEMENT_CURRENCY}")
+    if amount > settings.MAXIMUM_TRANSFER:
+        raise LimitExceeded(400, f"Maximum transaction amount is {settings.MAXIMUM_TRANSFER} {settings.SETTLEMENT_CURRENCY}")
+    velocity.check(account_id, amount, reserved=reserved)
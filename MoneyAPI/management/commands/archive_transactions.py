@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from MoneyAPI.archive import archive_settled_transactions
+
+
+class Command(BaseCommand):
+    help = "Move settled transactions older than the cutoff into the monthly archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, help="Defaults to TRANSACTION_ARCHIVE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, help="Defaults to TRANSACTION_ARCHIVE_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        archived = archive_settled_transactions(
+            older_than_days=options['older_than_days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} transactions."))
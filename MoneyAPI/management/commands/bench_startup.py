@@ -0,0 +1,103 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+ENTRY_POINTS = {'asgi': 'MoneyAPI.asgi', 'wsgi': 'MoneyAPI.wsgi'}
+
+# Runs in a fresh interpreter: import the entry point, then serve one request through it.
+CHILD = r'''
+import io, json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MoneyAPI.settings')
+import importlib
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+path = sys.argv[2]
+result = {}
+if sys.argv[1].endswith('asgi'):
+    import asyncio
+
+    received = []
+
+    async def receive():
+        if received:
+            # No disconnect: wait until Django cancels the listener after responding.
+            await asyncio.Event().wait()
+        received.append(True)
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    asyncio.run(module.application(scope, receive, send))
+else:
+    def start_response(status, headers, exc_info=None):
+        result['status'] = int(status.split()[0])
+
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0),
+        'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    b''.join(module.application(environ, start_response))
+finished = time.perf_counter()
+result.update(import_s=imported - started, first_request_s=finished - imported)
+try:
+    import resource
+    result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    pass
+print(json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = "Measure cold start of the ASGI/WSGI entry points: import time plus the first request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', choices=[*ENTRY_POINTS, 'both'], default='both')
+        parser.add_argument('--path', default='/api/openapi.json', help="Path of the first request.")
+        parser.add_argument('--repeat', type=int, default=5, help="Fresh processes per entry point.")
+
+    def run_once(self, module, path):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-c', CHILD, module, path],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        wall = time.perf_counter() - started
+        if process.returncode != 0:
+            raise CommandError(f"{module} failed to start:\n{process.stderr}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        result['process_s'] = wall
+        return result
+
+    def handle(self, *args, **options):
+        entries = ENTRY_POINTS if options['entry'] == 'both' else {options['entry']: ENTRY_POINTS[options['entry']]}
+        self.stdout.write(
+            f"{'entry':<6} {'import ms':>10} {'1st req ms':>11} {'process ms':>11} {'max RSS MB':>11} status"
+        )
+        for name, module in entries.items():
+            runs = [self.run_once(module, options['path']) for _ in range(options['repeat'])]
+
+            def median_ms(key):
+                return statistics.median(run[key] for run in runs) * 1000
+
+            rss = statistics.median(run.get('max_rss_kb', 0) for run in runs) / 1024
+            self.stdout.write(
+                f"{name:<6} {median_ms('import_s'):>10.1f} {median_ms('first_request_s'):>11.1f} "
+                f"{median_ms('process_s'):>11.1f} {rss:>11.1f} {runs[-1].get('status')}"
+            )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from MoneyAPI.openapi import build, cache_path, schema_version
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI document into OPENAPI_CACHE_DIR so workers never build it at runtime."
+
+    def handle(self, *args, **options):
+        version = schema_version()
+        content = build(version)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {cache_path(version)} ({len(content)} bytes)."))
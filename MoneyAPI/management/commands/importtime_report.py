@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker imports before serving its first request: the entry point plus the URL conf,
+# which pulls in the ninja router and every schema.
+CHILD = (
+    "import importlib, sys; "
+    "importlib.import_module(sys.argv[1]); "
+    "import MoneyAPI.urls"
+)
+
+
+class Command(BaseCommand):
+    help = "Report worker import cost from `python -X importtime`, by package and by module."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', choices=['asgi', 'wsgi'], default='asgi')
+        parser.add_argument('--profile', choices=['full', 'api'], help="MONEYAPI_PROFILE for the measured process.")
+        parser.add_argument('--top', type=int, default=25, help="Number of rows per table.")
+
+    def handle(self, *args, **options):
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'MoneyAPI.settings')
+        if options['profile']:
+            env['MONEYAPI_PROFILE'] = options['profile']
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD, f"MoneyAPI.{options['entry']}"],
+            capture_output=True, text=True, env=env,
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr)
+
+        modules = []
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        total = sum(packages.values())
+
+        self.stdout.write(f"{len(modules)} modules imported in {total / 1000:.1f} ms "
+                          f"(profile: {env.get('MONEYAPI_PROFILE', 'full')})\n")
+        self.stdout.write(f"{'self ms':>9} {'share':>6}  package")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:>9.1f} {self_us / total:>6.1%}  {package}")
+
+        self.stdout.write(f"\n{'cum. ms':>9} {'self ms':>9}  module")
+        for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[2])[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:>9.1f} {self_us / 1000:>9.1f}  {name}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from MoneyAPI.deletion import purge_deleted
+
+
+class Command(BaseCommand):
+    help = "Physically remove soft-deleted bank servers and accounts, and their transactions, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, help="Defaults to DELETED_PURGE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, help="Defaults to DELETED_PURGE_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        servers, accounts, transactions = purge_deleted(
+            older_than_days=options['older_than_days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {servers} bank servers, {accounts} bank accounts and {transactions} transactions."
+        ))
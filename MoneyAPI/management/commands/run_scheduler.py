@@ -0,0 +1,37 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from MoneyAPI.scheduler import run_due
+from MoneyAPI.snapshots import sync_all
+
+
+class Command(BaseCommand):
+    help = "Create the transactions of due scheduled transactions, in batches, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Defaults to SCHEDULED_TRANSACTION_BATCH_SIZE.")
+        parser.add_argument('--poll-interval', type=float, help="Defaults to SCHEDULER_POLL_INTERVAL.")
+        parser.add_argument('--once', action='store_true', help="Run until nothing is due, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.SCHEDULED_TRANSACTION_BATCH_SIZE
+        poll_interval = options['poll_interval'] or settings.SCHEDULER_POLL_INTERVAL
+        created = 0
+        try:
+            while True:
+                count = run_due(batch_size=batch_size)
+                created += count
+                if count < batch_size:
+                    if options['once']:
+                        break
+                    # Randomized, so several schedulers do not poll in lockstep.
+                    time.sleep(poll_interval * random.uniform(0.5, 1.5))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # The velocity counted for the last batches, not synced yet.
+            sync_all()
+        self.stdout.write(self.style.SUCCESS(f"Created {created} scheduled transactions."))
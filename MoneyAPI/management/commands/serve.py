@@ -0,0 +1,242 @@
+import ctypes
+import gc
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from MoneyAPI.snapshots import sync_all
+
+# Per-worker counters in shared memory, one row per worker slot.
+STAT_FIELDS = ('pid', 'requests', 'active', 'restarts', 'started_at')
+
+# A worker exiting within FAST_FAILURE_SECONDS of its start is respawned after a backoff
+# doubling from BACKOFF_SECONDS up to MAX_BACKOFF_SECONDS; serve gives up after
+# --max-fast-failures of them in a row in one slot.
+FAST_FAILURE_SECONDS = 10
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+
+
+class StatsMiddleware:
+    """ASGI wrapper counting the requests of one worker into its shared-memory row."""
+
+    def __init__(self, app, stats, slot):
+        self.app = app
+        self.stats = stats
+        self.base = slot * len(STAT_FIELDS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        self.stats[self.base + 1] += 1
+        self.stats[self.base + 2] += 1
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.stats[self.base + 2] -= 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve MoneyAPI.asgi with a pre-forked pool of uvicorn workers. The app is loaded once "
+        "before forking so its memory is shared copy-on-write, and workers are recycled after "
+        "--max-requests. Send SIGUSR1 to log per-worker stats, SIGHUP to recycle all workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Defaults to the core count.")
+        parser.add_argument('--max-requests', type=int, default=10000,
+                            help="Recycle a worker after this many requests (0 disables).")
+        parser.add_argument('--max-requests-jitter', type=int, default=1000,
+                            help="Random extra requests per worker, so workers do not recycle together.")
+        parser.add_argument('--backlog', type=int, default=2048)
+        parser.add_argument('--keep-alive', type=int, default=5, help="Keep-alive timeout in seconds.")
+        parser.add_argument('--graceful-timeout', type=int, default=30,
+                            help="Seconds a recycled or stopped worker gets to finish its requests.")
+        parser.add_argument('--stats-file', help="Write per-worker stats as JSON to this file every second.")
+        parser.add_argument('--access-log', action='store_true')
+        parser.add_argument('--max-fast-failures', type=int, default=5,
+                            help="Stop when a worker exits this many times in a row right after starting.")
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError("serve needs os.fork(); run uvicorn directly on this platform.")
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("uvicorn is not installed (pip install 'uvicorn[standard]').")
+        self.uvicorn = uvicorn
+        self.options = options
+
+        # Preload: import the app, URL conf, router and schemas once in the parent.
+        from MoneyAPI.asgi import application
+        import MoneyAPI.urls  # noqa: F401
+        self.application = application
+        # Children must open their own DB connections.
+        connections.close_all()
+
+        self.socket = socket.socket(socket.AF_INET6 if ':' in options['host'] else socket.AF_INET)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((options['host'], options['port']))
+        self.socket.listen(options['backlog'])
+        self.socket.set_inheritable(True)
+
+        self.workers = options['workers']
+        self.stats = multiprocessing.RawArray(ctypes.c_double, self.workers * len(STAT_FIELDS))
+        self.pids = {}
+        self.started = {}       # slot -> monotonic time of the last spawn
+        self.failures = {}      # slot -> fast failures in a row
+        self.respawns = {}      # slot -> monotonic time to respawn it at
+        self.stopping = False
+        self.gave_up = False
+
+        # Move everything loaded so far out of the GC's reach, so collections in the workers
+        # do not touch (and un-share) the preloaded pages.
+        gc.collect()
+        gc.freeze()
+
+        loop = 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+        http = 'httptools' if importlib.util.find_spec('httptools') else 'h11'
+        self.stdout.write(
+            f"Serving on {options['host']}:{options['port']} with {self.workers} workers "
+            f"(loop={loop}, http={http}, max_requests={options['max_requests']})"
+        )
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, lambda *_: self.log_stats())
+        signal.signal(signal.SIGHUP, lambda *_: self.signal_workers(signal.SIGTERM))
+        for slot in range(self.workers):
+            self.spawn(slot)
+        self.supervise()
+        if self.gave_up:
+            raise CommandError("Workers keep exiting right after starting; see the errors above.")
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid:
+            self.pids[pid] = slot
+            self.started[slot] = time.monotonic()
+            return
+        # uvicorn installs its own SIGTERM/SIGINT handlers; the supervisor-only signals are
+        # ignored so that signalling the whole process group does not kill the workers.
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        for signum in (signal.SIGUSR1, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_IGN)
+        random.seed()
+        row = slot * len(STAT_FIELDS)
+        self.stats[row] = os.getpid()
+        self.stats[row + 1] = self.stats[row + 2] = 0
+        self.stats[row + 4] = time.time()
+
+        max_requests = self.options['max_requests']
+        if max_requests:
+            max_requests += random.randint(0, self.options['max_requests_jitter'])
+        config = self.uvicorn.Config(
+            StatsMiddleware(self.application, self.stats, slot),
+            loop='auto',
+            http='auto',
+            lifespan='off',
+            backlog=self.options['backlog'],
+            timeout_keep_alive=self.options['keep_alive'],
+            timeout_graceful_shutdown=self.options['graceful_timeout'],
+            limit_max_requests=max_requests or None,
+            access_log=self.options['access_log'],
+        )
+        exit_code = 1
+        try:
+            self.uvicorn.Server(config).run(sockets=[self.socket])
+            exit_code = 0
+        finally:
+            try:
+                # os._exit() skips atexit, so flush the velocity and risk snapshots here.
+                sync_all()
+            finally:
+                os._exit(exit_code)
+
+    def supervise(self):
+        last_stats = 0
+        while self.pids or self.respawns:
+            pid = status = 0
+            if self.pids:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+            if pid:
+                slot = self.pids.pop(pid)
+                if not self.stopping:
+                    # Recycled after max requests, crashed or sent SIGHUP: replace it.
+                    self.schedule_respawn(slot, os.waitstatus_to_exitcode(status))
+                continue
+            now = time.monotonic()
+            for slot, respawn_at in list(self.respawns.items()):
+                if now >= respawn_at:
+                    del self.respawns[slot]
+                    self.stats[slot * len(STAT_FIELDS) + 3] += 1
+                    self.spawn(slot)
+            if self.options['stats_file'] and time.monotonic() - last_stats >= 1:
+                last_stats = time.monotonic()
+                self.write_stats()
+            time.sleep(0.2)
+
+    def schedule_respawn(self, slot, exit_code):
+        uptime = time.monotonic() - self.started.pop(slot)
+        if uptime >= FAST_FAILURE_SECONDS:
+            self.failures[slot] = 0
+            self.respawns[slot] = 0
+            return
+        failures = self.failures[slot] = self.failures.get(slot, 0) + 1
+        if failures > self.options['max_fast_failures']:
+            self.stderr.write(f"worker {slot} exited {failures} times in a row right after starting; giving up")
+            self.gave_up = True
+            self.stop()
+            return
+        delay = min(BACKOFF_SECONDS * 2 ** (failures - 1), MAX_BACKOFF_SECONDS)
+        self.stderr.write(
+            f"worker {slot} exited with code {exit_code} after {uptime:.1f}s; respawning in {delay:.1f}s"
+        )
+        self.respawns[slot] = time.monotonic() + delay
+
+    def stop(self, *args):
+        self.stopping = True
+        self.respawns.clear()
+        self.signal_workers(signal.SIGTERM)
+
+    def signal_workers(self, signum):
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def worker_stats(self):
+        return [
+            dict(zip(STAT_FIELDS, self.stats[slot * len(STAT_FIELDS):(slot + 1) * len(STAT_FIELDS)]), slot=slot)
+            for slot in range(self.workers)
+        ]
+
+    def log_stats(self):
+        for row in self.worker_stats():
+            uptime = time.time() - row['started_at'] if row['started_at'] else 0
+            self.stdout.write(
+                f"worker {row['slot']}: pid={int(row['pid'])} requests={int(row['requests'])} "
+                f"active={int(row['active'])} restarts={int(row['restarts'])} uptime={uptime:.0f}s"
+            )
+
+    def write_stats(self):
+        path = self.options['stats_file']
+        with open(f"{path}.tmp", 'w') as stats_file:
+            json.dump({'master_pid': os.getpid(), 'workers': self.worker_stats()}, stats_file)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,271 @@
+# middleware.py
+import logging
+import threading
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .models import current_tenant
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: pip install zstandard
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+class GzipCodec:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCodec:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCodec:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Content-Encoding -> codec, in server preference order for equal client q-values.
+CODECS = {'gzip': GzipCodec}
+if brotli is not None:
+    CODECS = {'br': BrotliCodec, **CODECS}
+if zstandard is not None:
+    CODECS = {'zstd': ZstdCodec, **CODECS}
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the supported encoding with the highest q-value in an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for coding in CODECS:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress_stream(codec, chunks):
+    for chunk in chunks:
+        data = codec.compress(chunk) + codec.flush()
+        if data:
+            yield data
+    yield codec.finish()
+
+
+async def compress_async_stream(codec, chunks):
+    async for chunk in chunks:
+        data = codec.compress(chunk) + codec.flush()
+        if data:
+            yield data
+    yield codec.finish()
+
+
+class Middleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, so an async view
+    served over ASGI keeps running on the event loop. ``__call__`` hands requests to
+    ``__acall__`` when the rest of the stack is async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class CompressionMiddleware(Middleware):
+    """
+    Compress responses with zstd, brotli or gzip, whichever the client prefers and is
+    installed. Streamed responses are compressed incrementally, flushing after every
+    chunk so consumers still receive data as it is produced.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        codec = CODECS[encoding]()
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(codec, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(codec, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = codec.compress(response.content) + codec.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The body differs per encoding, so a strong validator has to become weak.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class TenantScopeMiddleware(Middleware):
+    """
+    Clears the tenant scope around every request (see tenants.py), so the scope an API
+    key set for one request never carries over to the next request the thread serves.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = current_tenant.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_tenant.reset(token)
+
+    async def __acall__(self, request):
+        token = current_tenant.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_tenant.reset(token)
+
+
+class ReadinessCheck:
+    """Database connectivity, checked at most once every ``READINESS_CHECK_TTL`` seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._error = None
+        self._checked_at = None
+
+    def check(self):
+        """Run ``SELECT 1`` on the default database; the error message, or None when it worked."""
+        try:
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception as exc:
+            logger.warning("Readiness check failed: %s", exc)
+            return str(exc) or exc.__class__.__name__
+        return None
+
+    def error(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at > settings.READINESS_CHECK_TTL:
+                self._error = self.check()
+                self._checked_at = now
+            return self._error
+
+
+class ProbeMiddleware(Middleware):
+    """
+    Answer load balancer probes before the rest of the middleware stack runs.
+
+    - ``/healthz``: the process is up and serving; no database access.
+    - ``/readyz``: the database is reachable too, through ``ReadinessCheck``, so however
+      often the balancers probe, each process queries at most once per TTL. 503 otherwise.
+
+    Listed first in ``MIDDLEWARE``: probes skip host validation, sessions, CSRF, API key
+    authentication and the ORM, and any other path costs one comparison.
+    """
+    PATHS = ('/healthz', '/readyz')
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.readiness = ReadinessCheck()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.is_probe(request):
+            return self.get_response(request)
+        error = self.readiness.error() if request.path_info == '/readyz' else None
+        return self.probe_response(error)
+
+    async def __acall__(self, request):
+        if not self.is_probe(request):
+            return await self.get_response(request)
+        error = await sync_to_async(self.readiness.error)() if request.path_info == '/readyz' else None
+        return self.probe_response(error)
+
+    def is_probe(self, request):
+        return request.path_info in self.PATHS and request.method in ('GET', 'HEAD')
+
+    @staticmethod
+    def probe_response(error):
+        if error is None:
+            status, content = 200, b'{"status":"ok"}'
+        else:
+            status, content = 503, b'{"status":"unavailable"}'
+        response = HttpResponse(content, status=status, content_type='application/json')
+        response['Cache-Control'] = 'no-store'
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0003_apikey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountVelocity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('windows', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='velocity', to='MoneyAPI.bankaccount')),
+            ],
+        ),
+    ]
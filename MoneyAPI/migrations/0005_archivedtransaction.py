@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0004_accountvelocity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('transaction_type', models.CharField(choices=[('BANK', 'Bank Transfer'), ('MOBILE', 'Mobile Money Transfer')], max_length=6)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('target_iban', models.CharField(blank=True, max_length=34, null=True)),
+                ('target_swift_code', models.CharField(blank=True, max_length=11, null=True)),
+                ('target_bank_account_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('target_bank_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('target_phone_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('target_country', models.CharField(blank=True, max_length=50, null=True)),
+                ('provider', models.CharField(blank=True, max_length=50, null=True)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('success', 'success'), ('failed', 'failed')], default='Pending', max_length=20)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('period', models.CharField(db_index=True, max_length=7)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('source_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='MoneyAPI.bankaccount')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
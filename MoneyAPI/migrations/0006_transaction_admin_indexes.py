@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0005_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['target_bank_account_number'], name='txn_target_account_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['target_phone_number'], name='txn_target_phone_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['target_iban'], name='txn_target_iban_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0006_transaction_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
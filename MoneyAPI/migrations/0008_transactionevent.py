@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:45
+
+import MoneyAPI.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0007_transaction_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('transaction_id', models.BigIntegerField(db_index=True)),
+                ('type', models.PositiveSmallIntegerField(choices=[(1, 'created'), (2, 'status_changed'), (3, 'deleted')])),
+                ('data', models.JSONField(encoder=MoneyAPI.models.CompactJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
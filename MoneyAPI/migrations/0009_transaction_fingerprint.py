@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0008_transactionevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='duplicate_of',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='duplicate_of',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['fingerprint', 'created_at'], name='txn_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+def settle_existing(apps, schema_editor):
+    # Amounts so far were all in USD, the settlement currency.
+    for name in ('Transaction', 'ArchivedTransaction'):
+        apps.get_model('MoneyAPI', name).objects.update(settlement_amount=models.F('amount'), fx_rate=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0009_transaction_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='fx_rate',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='settlement_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fx_rate',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='settlement_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(settle_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:51
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def assign_default_tenant(apps, schema_editor):
+    # Everything created before tenants existed belongs to one "default" tenant.
+    names = ('APIKey', 'BankAccount', 'Transaction', 'ArchivedTransaction')
+    if not any(apps.get_model('MoneyAPI', name).objects.exists() for name in names):
+        return
+    tenant, _ = apps.get_model('MoneyAPI', 'Tenant').objects.get_or_create(name='default')
+    for name in names:
+        apps.get_model('MoneyAPI', name).objects.filter(tenant__isnull=True).update(tenant=tenant)
+    apps.get_model('MoneyAPI', 'TransactionEvent').objects.filter(tenant_id__isnull=True).update(tenant_id=tenant.id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0010_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transactionevent',
+            name='tenant_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transactionevent',
+            index=models.Index(fields=['tenant_id', 'id'], name='event_tenant_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='apikey',
+            name='api_key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='tenant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='api_keys', to='MoneyAPI.tenant'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='MoneyAPI.tenant'),
+        ),
+        migrations.AddField(
+            model_name='bankaccount',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='MoneyAPI.tenant'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='tenant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='MoneyAPI.tenant'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['tenant', 'id'], name='archived_txn_tenant_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccount',
+            index=models.Index(fields=['tenant', 'account_number'], name='account_tenant_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['tenant', 'id'], name='txn_tenant_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['tenant', 'created_at'], name='txn_tenant_created_idx'),
+        ),
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+    ]
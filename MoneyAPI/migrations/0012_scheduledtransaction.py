@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0011_tenant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('BANK', 'Bank Transfer'), ('MOBILE', 'Mobile Money Transfer')], max_length=6)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('target_iban', models.CharField(blank=True, max_length=34, null=True)),
+                ('target_swift_code', models.CharField(blank=True, max_length=11, null=True)),
+                ('target_bank_account_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('target_bank_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('target_phone_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('target_country', models.CharField(blank=True, max_length=50, null=True)),
+                ('provider', models.CharField(blank=True, max_length=50, null=True)),
+                ('recurrence', models.CharField(choices=[('once', 'Once'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='once', max_length=7)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('jitter', models.PositiveIntegerField(default=0)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transactions', to='MoneyAPI.bankaccount')),
+                ('tenant', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='MoneyAPI.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('next_run_at__isnull', False)), fields=['next_run_at'], name='sched_next_run_idx'), models.Index(fields=['tenant', 'id'], name='sched_tenant_id_idx')],
+            },
+        ),
+    ]
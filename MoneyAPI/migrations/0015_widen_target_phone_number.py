@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0014_risk_scoring'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedtransaction',
+            name='target_phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AlterField(
+            model_name='scheduledtransaction',
+            name='target_phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='target_phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoneyAPI', '0015_widen_target_phone_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bankserver',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='bankserver',
+            name='server_ip_address',
+            field=models.GenericIPAddressField(),
+        ),
+        migrations.AddConstraint(
+            model_name='bankserver',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name',), name='server_live_name_uniq', violation_error_message='A bank server with this name already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='bankserver',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('server_ip_address',), name='server_live_ip_uniq', violation_error_message='A bank server with this IP address already exists.'),
+        ),
+    ]
@@ -1,11 +1,73 @@
 # models.py
+from contextvars import ContextVar
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from uuid import uuid4
 
+class Tenant(models.Model):
+    """A partner using the API; its API keys only see its own accounts and transactions."""
+    name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+# Tenant of the API request being served; None for the master key and outside API requests (see tenants.py).
+current_tenant = ContextVar('current_tenant', default=None)
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_tenant(self, tenant_id):
+        """Rows of one tenant; ``None`` (the master key) means all tenants."""
+        if tenant_id is None:
+            return self
+        return self.filter(tenant_id=tenant_id)
+
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    """Manager that only sees the rows of ``current_tenant``; ``all_objects`` sees every tenant's."""
+
+    def get_queryset(self):
+        return super().get_queryset().for_tenant(current_tenant.get())
+
+
+class LiveManager(models.Manager):
+    """Manager leaving out soft-deleted rows; ``all_objects`` still sees them (see deletion.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class LiveTenantManager(TenantManager):
+    """``TenantManager`` also leaving out soft-deleted rows."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class BankServer(models.Model):
     """Represents a commercial bank's server."""
-    name = models.CharField(max_length=100, unique=True)       # e.g., "Chase Bank"
-    server_ip_address = models.GenericIPAddressField(unique=True)
+    name = models.CharField(max_length=100)       # e.g., "Chase Bank"
+    server_ip_address = models.GenericIPAddressField()
+    deleted_at = models.DateTimeField(blank=True, null=True)   # Soft-deleted, purged later with its accounts
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # Unique among live servers only, so a deleted server's name and address can be reused.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'], name='server_live_name_uniq', condition=models.Q(deleted_at__isnull=True),
+                violation_error_message="A bank server with this name already exists.",
+            ),
+            models.UniqueConstraint(
+                fields=['server_ip_address'], name='server_live_ip_uniq', condition=models.Q(deleted_at__isnull=True),
+                violation_error_message="A bank server with this IP address already exists.",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -13,29 +75,35 @@ class BankServer(models.Model):
 
 class BankAccount(models.Model):
     """Represents an individual bank account under a BankServer."""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, db_index=False, null=True)   # Indexed with the account number
     bank_server = models.ForeignKey(BankServer, on_delete=models.CASCADE)
     account_name = models.CharField(max_length=50)
     account_number = models.CharField(max_length=20)
+    deleted_at = models.DateTimeField(blank=True, null=True)   # Soft-deleted, purged later with its transactions
+
+    objects = LiveTenantManager()
+    all_objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'account_number'], name='account_tenant_number_idx'),
+        ]
+
     def __str__(self):
         return f"{self.account_name} - {self.account_number}"
 
 
-class Transaction(models.Model):
-    """Records each transaction (mobile money or bank transfer) with necessary details."""
+class TransferDetails(models.Model):
+    """What to send and where: shared by transactions and scheduled transactions."""
     TRANSACTION_TYPES = [
         ('BANK', 'Bank Transfer'),
         ('MOBILE', 'Mobile Money Transfer')
     ]
-    TRANSACTION_STATUSES = [
-        ('pending', 'pending'),
-        ('success', 'success'),
-        ('failed', 'failed'),
-    ]
-    
+
     transaction_type = models.CharField(max_length=6, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
-    source_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="transactions")
-    
+    currency = models.CharField(max_length=3, default='USD')     # ISO 4217 code of `amount`
+
     # Target information for bank transfers
     target_iban = models.CharField(max_length=34, blank=True, null=True)          # IBAN for international transfers
     target_swift_code = models.CharField(max_length=11, blank=True, null=True)     # SWIFT code for international banks
@@ -43,20 +111,189 @@ class Transaction(models.Model):
     target_bank_name = models.CharField(max_length=100, blank=True, null=True)     # Name of the bank receiving the funds
     
     # Target information for mobile money transfers
-    target_phone_number = models.CharField(max_length=15, blank=True, null=True)   # Mobile number for mobile money transfers
+    target_phone_number = models.CharField(max_length=16, blank=True, null=True)   # E.164 mobile number for mobile money transfers, with the '+'
     target_country = models.CharField(max_length=50, blank=True, null=True)        # Country for mobile money transfers
     provider = models.CharField(max_length=50, blank=True, null=True)              # Mobile money provider (e.g., Airtel, MTN)
 
+    class Meta:
+        abstract = True
+
+
+class TransactionRecord(TransferDetails):
+    """Fields shared by live transactions and their archived copies."""
+    TRANSACTION_STATUSES = [
+        ('pending', 'pending'),
+        ('success', 'success'),
+        ('failed', 'failed'),
+    ]
+
+    settlement_amount = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)   # `amount` in SETTLEMENT_CURRENCY
+    fx_rate = models.DecimalField(max_digits=20, decimal_places=10, blank=True, null=True)   # Rate used for settlement_amount
+
     status = models.CharField(max_length=20, default='Pending', choices=TRANSACTION_STATUSES, editable=True)                    # Transaction status
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    version = models.PositiveIntegerField(default=0)    # Bumped on every status change, exposed as the ETag
+    fingerprint = models.CharField(max_length=32, blank=True, default='')   # Hash of account, target and amount (see duplicates.py)
+    duplicate_of = models.BigIntegerField(blank=True, null=True)   # Earlier transaction with the same fingerprint, when flagged
+    risk_score = models.PositiveSmallIntegerField(blank=True, null=True)   # 0-100 from the risk scorers at ingest (see risk.py)
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} - {self.status}"
 
 
+class Transaction(TransactionRecord):
+    """Records each transaction (mobile money or bank transfer) with necessary details."""
+    SETTLED_STATUSES = ('success', 'failed')
+    # Legal status changes: new status -> statuses it may be reached from.
+    STATUS_TRANSITIONS = {
+        'success': ('pending',),
+        'failed': ('pending',),
+    }
+
+    source_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="transactions")
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, db_index=False, null=True)   # Same as the source account's
+
+    objects = TenantManager()
+    all_objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Per-tenant listing (by id) and date ranges.
+            models.Index(fields=['tenant', 'id'], name='txn_tenant_id_idx'),
+            models.Index(fields=['tenant', 'created_at'], name='txn_tenant_created_idx'),
+            # Prefix search in the admin; pattern ops let PostgreSQL use them for LIKE 'x%'.
+            models.Index(fields=['target_bank_account_number'], name='txn_target_account_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['target_phone_number'], name='txn_target_phone_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['target_iban'], name='txn_target_iban_idx', opclasses=['varchar_pattern_ops']),
+            # Duplicate detection: recent transactions with a given fingerprint.
+            models.Index(fields=['fingerprint', 'created_at'], name='txn_fingerprint_idx'),
+        ]
+
+
+class ArchivedTransaction(TransactionRecord):
+    """A settled transaction moved out of the live table by archive.py, keeping its original id."""
+    id = models.BigIntegerField(primary_key=True)
+    source_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="archived_transactions")
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, db_index=False, null=True)
+    created_at = models.DateTimeField(db_index=True)
+    period = models.CharField(max_length=7, db_index=True)   # Month of created_at, e.g. "2024-11"
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+    all_objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'id'], name='archived_txn_tenant_id_idx'),
+        ]
+
+
+class ScheduledTransaction(TransferDetails):
+    """A transfer to be created at a future time, once or on a recurrence (see scheduler.py)."""
+    RECURRENCES = [
+        ('once', 'Once'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    source_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="scheduled_transactions")
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, db_index=False, null=True)   # Same as the source account's
+    recurrence = models.CharField(max_length=7, choices=RECURRENCES, default='once')
+    starts_at = models.DateTimeField()      # First run; later runs keep its time and day of month
+    ends_at = models.DateTimeField(blank=True, null=True)   # No runs after this
+    jitter = models.PositiveIntegerField(default=0)     # Seconds every run is shifted by, to spread runs due at the same time
+    next_run_at = models.DateTimeField(blank=True, null=True)   # Null once the schedule is finished
+    runs = models.PositiveIntegerField(default=0)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_transaction_id = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+    all_objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Due schedules; finished ones are left out of the index.
+            models.Index(
+                fields=['next_run_at'], name='sched_next_run_idx', condition=models.Q(next_run_at__isnull=False)
+            ),
+            models.Index(fields=['tenant', 'id'], name='sched_tenant_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_recurrence_display()} {self.transaction_type} - {self.amount} {self.currency}"
+
+
+class FxRate(models.Model):
+    """Value of one unit of a currency in SETTLEMENT_CURRENCY (see fx.py)."""
+    currency = models.CharField(max_length=3, unique=True)     # ISO 4217 code, e.g. "KES"
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.currency} {self.rate}"
+
 
 class APIKey(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="api_keys", null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    api_key = models.UUIDField(unique=True, editable=False, default=uuid4())
+    api_key = models.UUIDField(unique=True, editable=False, default=uuid4)   # A new key per row
+
+
+class AccountVelocity(models.Model):
+    """Synced snapshot of an account's rolling velocity windows (see limits.py)."""
+    account = models.OneToOneField(BankAccount, on_delete=models.CASCADE, related_name="velocity")
+    windows = models.JSONField(default=dict)   # {"hour": [[bucket, "amount", count], ...], ...}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Velocity for {self.account}"
+
+
+class AccountRiskFeatures(models.Model):
+    """Checkpoint of an account's risk features (see risk.py)."""
+    account = models.OneToOneField(BankAccount, on_delete=models.CASCADE, related_name="risk_features")
+    features = models.JSONField(default=dict)   # {"count": n, "sum": x, "sum_squares": x, "targets": [...]}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Risk features for {self.account}"
+
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """JSON without whitespace between items, for rows stored in bulk."""
+    item_separator = ','
+    key_separator = ':'
+
+
+class TransactionEvent(models.Model):
+    """One entry of the append-only transaction event log (see events.py)."""
+    CREATED, STATUS_CHANGED, DELETED = 1, 2, 3
+    EVENT_TYPES = [
+        (CREATED, 'created'),
+        (STATUS_CHANGED, 'status_changed'),
+        (DELETED, 'deleted'),
+    ]
 
+    id = models.BigAutoField(primary_key=True)     # Sequence number; replay checkpoints refer to it
+    transaction_id = models.BigIntegerField(db_index=True)   # No FK: events outlive deleted transactions
+    tenant_id = models.BigIntegerField(null=True)   # Tenant of the transaction, plain id for the same reason
+    type = models.PositiveSmallIntegerField(choices=EVENT_TYPES)
+    data = models.JSONField(encoder=CompactJSONEncoder)   # Only the fields that changed, nulls left out
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantManager()
+    all_objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant_id', 'id'], name='event_tenant_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.get_type_display()} transaction {self.transaction_id}"
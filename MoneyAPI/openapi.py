@@ -0,0 +1,99 @@
+# openapi.py
+"""
+Precomputed OpenAPI document.
+
+Building the schema walks every operation and pydantic model, which is slow enough to
+show up on the first request of every fresh worker. Instead the document is generated
+once, by ``manage.py build_openapi`` at build time or by the first worker that needs it,
+and written to ``OPENAPI_CACHE_DIR`` under a version key. Every worker then serves the
+file's bytes as-is from ``/api/openapi.json``, which the Redoc page also reads.
+
+The version key changes whenever the API definition, ninja, pydantic or ``API_VERSION``
+changes, so a stale document is never served after a deploy. When the cache directory is
+not writable (e.g. a read-only container image), the document is generated in memory and
+served from there.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import ninja
+import pydantic
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+logger = logging.getLogger(__name__)
+
+# Modules whose source defines the OpenAPI document.
+SOURCES = ('api.py', 'schema.py')
+
+_document = None
+
+
+def schema_version():
+    """Short hash of everything the generated document depends on."""
+    digest = hashlib.sha256(f"{ninja.__version__}:{pydantic.VERSION}:{settings.API_VERSION}".encode())
+    for name in SOURCES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(version):
+    return Path(settings.OPENAPI_CACHE_DIR) / f"openapi-{version}.json"
+
+
+def generate():
+    """Generate the document's bytes."""
+    from .api import api
+
+    return json.dumps(api.get_openapi_schema(), separators=(',', ':')).encode()
+
+
+def write(version, content):
+    """Write the document atomically to the cache."""
+    path = cache_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+        tmp.write(content)
+    # NamedTemporaryFile creates the file as 0600; the cache is read by other users too.
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+
+
+def build(version=None):
+    """Generate the document and write it to the cache. Returns its bytes."""
+    version = version or schema_version()
+    content = generate()
+    write(version, content)
+    return content
+
+
+def get_document():
+    """Return ``(version, bytes)`` of the document, reading or building it once per process."""
+    global _document
+    if _document is None:
+        version = schema_version()
+        try:
+            content = cache_path(version).read_bytes()
+        except OSError:
+            content = generate()
+            try:
+                write(version, content)
+            except OSError as exc:
+                logger.warning("OpenAPI cache not writable, serving the document from memory: %s", exc)
+        _document = (version, content)
+    return _document
+
+
+def openapi_json(request):
+    version, content = get_document()
+    etag = f'"{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
@@ -0,0 +1,182 @@
+# profiling.py
+"""
+Opt-in profiling of single requests.
+
+A request is profiled when it carries ``X-Profile: <PROFILING_SECRET>``, or at random
+for a ``PROFILING_SAMPLE_RATE`` share of requests. For a profiled request the report
+holds:
+
+- the top of the cProfile stats, by cumulative time;
+- every SQL statement with its duration, via ``connection.execute_wrapper``;
+- the serialization time: how long ninja took to validate, dump and render what the
+  view returned, taken from the profile.
+
+Reports go into a ring buffer of the last ``PROFILING_BUFFER_SIZE`` reports of this
+process, listed in the admin under ``/admin/profiles/``; the response carries the report
+id in ``X-Profile-Id``. The body of a streamed response is produced after the view
+returns, so it is not part of the report.
+
+When profiling is off the middleware costs one header lookup per request. Only one
+request per process is profiled at a time (Python allows a single active profiler), so
+a request arriving while another one is profiled runs unprofiled. Under ASGI a profiled
+request is run from a worker thread, so the SQL its views run through ``sync_to_async``
+goes over that thread's connections and is recorded.
+"""
+import cProfile
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .middleware import Middleware
+
+# Lines of cProfile stats kept per report.
+STATS_LINES = 40
+
+# ninja's handling of a view's return value: response schema validation, dump and render.
+SERIALIZATION_FUNCTIONS = ('_result_to_response',)
+
+
+class ProfileReport:
+    """Profile of one request."""
+    __slots__ = (
+        'id', 'method', 'path', 'trigger', 'started_at', 'status', 'duration_ms',
+        'queries', 'serialization_ms', 'stacks',
+    )
+
+    def __init__(self, id, method, path, trigger):
+        self.id = id
+        self.method = method
+        self.path = path
+        self.trigger = trigger          # 'header' or 'sample'
+        self.started_at = timezone.now()
+        self.status = None
+        self.duration_ms = 0.0
+        self.queries = []               # (alias, sql, duration ms)
+        self.serialization_ms = 0.0
+        self.stacks = ''
+
+    @property
+    def sql_ms(self):
+        return sum(duration for _, _, duration in self.queries)
+
+
+class ReportBuffer:
+    """The last ``PROFILING_BUFFER_SIZE`` reports of this process."""
+
+    def __init__(self):
+        self._reports = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _deque(self):
+        if self._reports is None or self._reports.maxlen != settings.PROFILING_BUFFER_SIZE:
+            self._reports = deque(self._reports or (), maxlen=settings.PROFILING_BUFFER_SIZE)
+        return self._reports
+
+    def next_id(self):
+        return next(self._ids)
+
+    def add(self, report):
+        with self._lock:
+            self._deque().append(report)
+
+    def all(self):
+        """Reports, newest first."""
+        with self._lock:
+            return list(reversed(self._deque()))
+
+    def get(self, report_id):
+        with self._lock:
+            return next((report for report in self._deque() if report.id == report_id), None)
+
+
+reports = ReportBuffer()
+
+# Held while a request is profiled.
+_profiling = threading.Lock()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable timing every statement of one connection."""
+
+    def __init__(self, report, alias):
+        self.report = report
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.report.queries.append((self.alias, sql, (time.perf_counter() - started) * 1000))
+
+
+class ProfilingMiddleware(Middleware):
+    def trigger(self, request):
+        secret = settings.PROFILING_SECRET
+        header = request.META.get('HTTP_X_PROFILE')
+        if secret and header and constant_time_compare(header, secret):
+            return 'header'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trigger = self.trigger(request)
+        if trigger is None or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, trigger, self.get_response)
+        finally:
+            _profiling.release()
+
+    async def __acall__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            return await sync_to_async(self.profile)(request, trigger, async_to_sync(self.get_response))
+        finally:
+            _profiling.release()
+
+    def profile(self, request, trigger, get_response):
+        """Run the request under the profiler and the query recorders, and keep the report."""
+        report = ProfileReport(reports.next_id(), request.method, request.get_full_path(), trigger)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(QueryRecorder(report, alias)))
+            try:
+                profiler.enable()
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        report.duration_ms = (time.perf_counter() - started) * 1000
+        report.status = response.status_code
+
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output).sort_stats('cumulative')
+        stats.print_stats(STATS_LINES)
+        report.stacks = output.getvalue()
+        report.serialization_ms = sum(
+            cumulative * 1000
+            for (_, _, name), (_, _, _, cumulative, _) in stats.stats.items()
+            if name in SERIALIZATION_FUNCTIONS
+        )
+        reports.add(report)
+        response['X-Profile-Id'] = str(report.id)
+        return response
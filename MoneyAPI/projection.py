@@ -0,0 +1,103 @@
+# projection.py
+"""
+Sparse field selection for the transaction endpoints.
+
+``?fields=id,status,amount`` narrows both the SQL column list and the response, and
+``?expand=source_account,source_account.bank_server`` opts in to the nested objects.
+Without ``expand`` a projected transaction carries ``source_account`` as a plain id.
+Nested objects are filled from the in-memory registry, never by joins; accounts the
+registry does not hold (soft-deleted ones) are read once per call.
+"""
+from decimal import Decimal
+
+from ninja.errors import HttpError
+
+from .models import BankAccount
+from .registry import registry
+from .schema import TransactionSchema
+
+TRANSACTION_FIELDS = tuple(TransactionSchema.model_fields)
+EXPANDABLE = ('source_account', 'source_account.bank_server')
+
+# Response field -> model column, where they differ.
+COLUMNS = {'source_account': 'source_account_id'}
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class Projection:
+    """Fields and expansions requested for one call."""
+    __slots__ = ('fields', 'expand', 'accounts')
+
+    def __init__(self, fields, expand):
+        self.fields = fields
+        self.expand = expand
+        self.accounts = {}      # Accounts read from the database, by id
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        """
+        Build a projection from the ``fields``/``expand`` query parameters.
+
+        Returns:
+            Projection, or None when neither parameter was given (full representation).
+
+        Raises:
+            HttpError: 400 on unknown field or expansion names.
+        """
+        if fields is None and expand is None:
+            return None
+        names = _split(fields) if fields is not None else list(TRANSACTION_FIELDS)
+        unknown = [name for name in names if name not in TRANSACTION_FIELDS]
+        if unknown:
+            raise HttpError(400, f"Unknown fields: {', '.join(unknown)}")
+        expansions = set(_split(expand or ''))
+        unknown = expansions.difference(EXPANDABLE)
+        if unknown:
+            raise HttpError(400, f"Unknown expansions: {', '.join(sorted(unknown))}")
+        if 'source_account.bank_server' in expansions:
+            expansions.add('source_account')
+        return cls(names, expansions)
+
+    def columns(self, *extra):
+        """Model columns to select with ``values()``; always includes the id."""
+        columns = {'id', *extra}
+        columns.update(COLUMNS.get(name, name) for name in self.fields)
+        return list(columns)
+
+    def render(self, row):
+        """Project one ``values()`` row into a response dict."""
+        data = {}
+        for name in self.fields:
+            if name == 'source_account':
+                data[name] = self._account(row['source_account_id'])
+            elif name == 'created_at':
+                data[name] = row['created_at'].isoformat()
+            else:
+                value = row[name]
+                # Decimal columns are floats in TransactionSchema.
+                data[name] = float(value) if isinstance(value, Decimal) else value
+        return data
+
+    def _account(self, account_id):
+        if 'source_account' not in self.expand:
+            return account_id
+        account = registry.account(account_id)
+        if account is None:
+            account = self.accounts.get(account_id)
+        if account is None:
+            account = self.accounts[account_id] = (
+                BankAccount.all_objects.select_related('bank_server').get(id=account_id)
+            )
+        server = account.bank_server
+        return {
+            'id': account.id,
+            'bank_server': (
+                {'id': server.id, 'name': server.name}
+                if 'source_account.bank_server' in self.expand else server.id
+            ),
+            'account_name': account.account_name,
+            'account_number': account.account_number,
+        }
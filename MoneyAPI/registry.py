@@ -0,0 +1,215 @@
+# registry.py
+"""
+Process-local registry of BankServers and BankAccounts.
+
+Servers and accounts change rarely compared with transaction volume, so the hot paths
+(``create_transaction`` and transaction serialization) read them from here instead of the
+database. Entries are compact ``__slots__`` objects indexed by id and by account number.
+
+The registry is loaded lazily, kept current by the signal handlers in ``signals.py`` (which
+fire for the API endpoints and the admin alike), and fully reloaded every ``REGISTRY_TTL``
+seconds to pick up changes made by other processes. In between, a server or account
+missing from it (e.g. created by another worker) is looked up with one indexed query and
+added; ids that do not exist are remembered for ``REGISTRY_MISS_TTL`` seconds, so
+repeated unknown ids do not each cost a query.
+
+``get_account_or_404``, which guards the write paths (creating transactions and
+schedules), always reads the account from the database, so an account deleted by
+another worker cannot be used there either.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404
+
+from .models import BankServer, BankAccount, current_tenant
+
+# Unknown ids remembered between reloads.
+MAX_MISSES = 10000
+
+
+class ServerEntry:
+    __slots__ = ('id', 'name', 'server_ip_address')
+
+    def __init__(self, id, name, server_ip_address):
+        self.id = id
+        self.name = name
+        self.server_ip_address = server_ip_address
+
+
+class AccountEntry:
+    __slots__ = ('id', 'bank_server', 'account_name', 'account_number', 'tenant_id')
+
+    def __init__(self, id, bank_server, account_name, account_number, tenant_id=None):
+        self.id = id
+        self.bank_server = bank_server      # ServerEntry, shared by all accounts of the server
+        self.account_name = account_name
+        self.account_number = account_number
+        self.tenant_id = tenant_id
+
+    @property
+    def bank_server_id(self):
+        return self.bank_server.id
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._servers = None
+        self._accounts = None
+        self._by_number = None
+        self._misses = {}       # ('server' or 'account', id) -> monotonic time of the miss
+        self._loaded_at = 0.0
+
+    def _state(self):
+        with self._lock:
+            state = self._servers, self._accounts, self._by_number
+            stale = self._servers is None or time.monotonic() - self._loaded_at > settings.REGISTRY_TTL
+        if stale:
+            # The state reload() built, even if invalidate() has dropped it again since.
+            state = self.reload()
+        return state
+
+    def reload(self):
+        """Load all servers and accounts with two queries and swap them in. Returns the new state."""
+        servers = {
+            row[0]: ServerEntry(*row)
+            for row in BankServer.objects.values_list('id', 'name', 'server_ip_address')
+        }
+        accounts, by_number = {}, {}
+        # Every tenant's accounts: the registry is shared by all requests of the process.
+        for id, server_id, name, number, tenant_id in BankAccount.all_objects.filter(deleted_at__isnull=True).values_list(
+            'id', 'bank_server_id', 'account_name', 'account_number', 'tenant_id'
+        ):
+            if server_id in servers:
+                accounts[id] = AccountEntry(id, servers[server_id], name, number, tenant_id)
+                by_number[number] = by_number.get(number, ()) + (id,)
+        with self._lock:
+            self._servers, self._accounts, self._by_number = servers, accounts, by_number
+            self._misses = {}
+            self._loaded_at = time.monotonic()
+        return servers, accounts, by_number
+
+    def invalidate(self):
+        with self._lock:
+            self._servers = self._accounts = self._by_number = None
+            self._misses = {}
+
+    def _missed(self, key):
+        missed_at = self._misses.get(key)
+        return missed_at is not None and time.monotonic() - missed_at < settings.REGISTRY_MISS_TTL
+
+    def _miss(self, key):
+        with self._lock:
+            if len(self._misses) >= MAX_MISSES:
+                self._misses = {}
+            self._misses[key] = time.monotonic()
+
+    def server(self, server_id):
+        server = self._state()[0].get(server_id)
+        if server is None and not self._missed(('server', server_id)):
+            server = self._load_server(server_id)
+        return server
+
+    def servers(self):
+        return list(self._state()[0].values())
+
+    def account(self, account_id):
+        account = self._state()[1].get(account_id)
+        if account is None and not self._missed(('account', account_id)):
+            account = self._load_account(account_id)
+        return account
+
+    def accounts_by_number(self, account_number):
+        servers, accounts, by_number = self._state()
+        return [accounts[id] for id in by_number.get(account_number, ())]
+
+    def get_account_or_404(self, account_id):
+        """
+        The live account, which must belong to the current tenant (see tenants.py) if there
+        is one. Read from the database, and refreshed in the registry.
+        """
+        tenant_id = current_tenant.get()
+        account = self._load_account(account_id)
+        if account is None or (tenant_id is not None and account.tenant_id != tenant_id):
+            raise Http404("No BankAccount matches the given query.")
+        return account
+
+    def _load_server(self, server_id):
+        """Read a live server with one indexed query and add it; None when there is none."""
+        row = BankServer.objects.filter(id=server_id).values_list('id', 'name', 'server_ip_address').first()
+        if row is None:
+            self._miss(('server', server_id))
+            return None
+        with self._lock:
+            if self._servers is None:
+                return ServerEntry(*row)
+            return self._servers.setdefault(server_id, ServerEntry(*row))
+
+    def _load_account(self, account_id):
+        """Read a live account with one indexed query and add it; None (and dropped) when there is none."""
+        row = (
+            BankAccount.all_objects.filter(id=account_id, deleted_at__isnull=True)
+            .values_list('bank_server_id', 'account_name', 'account_number', 'tenant_id')
+            .first()
+        )
+        server = self.server(row[0]) if row is not None else None
+        if server is None:
+            self.account_deleted(account_id)
+            self._miss(('account', account_id))
+            return None
+        account = AccountEntry(account_id, server, *row[1:])
+        self._put_account(account)
+        return account
+
+    def server_saved(self, server):
+        with self._lock:
+            self._misses.pop(('server', server.id), None)
+            if self._servers is None:
+                return
+            entry = self._servers.get(server.id)
+            if entry is None:
+                self._servers[server.id] = ServerEntry(server.id, server.name, server.server_ip_address)
+            else:
+                # Updated in place so the accounts referencing it see the change.
+                entry.name = server.name
+                entry.server_ip_address = server.server_ip_address
+
+    def account_saved(self, account):
+        with self._lock:
+            if self._servers is None:
+                return
+            server = self._servers.get(account.bank_server_id)
+            if server is None:
+                self.invalidate()
+                return
+            self._put_account(AccountEntry(
+                account.id, server, account.account_name, account.account_number, account.tenant_id
+            ))
+
+    def _put_account(self, account):
+        with self._lock:
+            self._misses.pop(('account', account.id), None)
+            if self._servers is None:
+                return
+            self._discard_account(account.id)
+            self._accounts[account.id] = account
+            self._by_number[account.account_number] = self._by_number.get(account.account_number, ()) + (account.id,)
+
+    def account_deleted(self, account_id):
+        with self._lock:
+            if self._servers is not None:
+                self._discard_account(account_id)
+
+    def _discard_account(self, account_id):
+        entry = self._accounts.pop(account_id, None)
+        if entry is not None:
+            ids = tuple(id for id in self._by_number.get(entry.account_number, ()) if id != account_id)
+            if ids:
+                self._by_number[entry.account_number] = ids
+            else:
+                self._by_number.pop(entry.account_number, None)
+
+
+registry = Registry()
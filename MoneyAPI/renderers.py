@@ -0,0 +1,89 @@
+# renderers.py
+"""
+Response encodings negotiated through the Accept header.
+
+- ``application/json`` (default): plain JSON, as before.
+- ``application/vnd.moneyapi.columnar+json``: lists are sent as column names plus rows
+  of values. Nested objects with an ``id`` (``source_account``, its ``bank_server``)
+  are sent once in ``objects`` and referenced by id from the rows.
+- ``application/msgpack``: MessagePack, if the optional ``msgpack`` package is installed.
+"""
+from ninja.renderers import BaseRenderer, JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # Optional: pip install msgpack
+    msgpack = None
+
+
+def _dedupe(value, path, objects):
+    """Replace a nested object with its id, storing it once under ``objects[path]``."""
+    if isinstance(value, dict) and 'id' in value:
+        table = objects.setdefault(path, {})
+        if value['id'] not in table:
+            table[value['id']] = {
+                key: _dedupe(item, f'{path}.{key}', objects) for key, item in value.items()
+            }
+        return value['id']
+    return value
+
+
+def to_columnar(data):
+    """
+    Convert a list of objects into the columnar layout.
+
+    Example:
+        [{"id": 1, "source_account": {"id": 7, ...}}, {"id": 2, "source_account": {"id": 7, ...}}]
+        -> {"columns": ["id", "source_account"], "rows": [[1, 7], [2, 7]],
+            "objects": {"source_account": {"7": {...}}}}
+    """
+    columns = {}
+    for row in data:
+        columns.update(dict.fromkeys(row))
+    columns = list(columns)
+    objects = {}
+    rows = [[_dedupe(row.get(column), column, objects) for column in columns] for row in data]
+    return {'columns': columns, 'rows': rows, 'objects': objects}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.moneyapi.columnar+json'
+    json_dumps_params = {'separators': (',', ':')}
+
+    def render(self, request, data, *, response_status):
+        if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+            data = to_columnar(data)
+        return super().render(request, data, response_status=response_status)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    charset = None
+    _encoder = NinjaJSONEncoder()
+
+    def render(self, request, data, *, response_status):
+        return msgpack.packb(data, default=self._encoder.default, use_bin_type=True)
+
+
+class NegotiatingRenderer(JSONRenderer):
+    """Default JSON renderer that hands off to a compact encoding the client asked for."""
+    alternatives = {ColumnarJSONRenderer.media_type: ColumnarJSONRenderer()}
+    if msgpack is not None:
+        alternatives['application/msgpack'] = alternatives['application/x-msgpack'] = MessagePackRenderer()
+
+    def select(self, request):
+        """Return the renderer for the first media type in Accept that we support."""
+        for media_range in request.META.get('HTTP_ACCEPT', '').split(','):
+            media_type = media_range.split(';')[0].strip().lower()
+            if media_type in self.alternatives:
+                return self.alternatives[media_type]
+            if media_type in ('application/json', 'application/*', '*/*'):
+                break
+        return self
+
+    @staticmethod
+    def content_type(renderer):
+        if renderer.charset:
+            return f"{renderer.media_type}; charset={renderer.charset}"
+        return renderer.media_type
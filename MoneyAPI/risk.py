@@ -0,0 +1,206 @@
+# risk.py
+"""
+Risk scoring of incoming transactions.
+
+Before a new transaction is saved, each scorer in ``RISK_SCORERS`` rates it against the
+source account's features. The sum of their points, capped at 100, is stored as
+``risk_score``. A transaction scoring ``RISK_REJECT_SCORE`` or more is created as
+``failed`` instead of ``pending``, so it is never paid out. ``score()`` serves
+``create_transaction``; ``score_many()`` serves batches such as the scheduler's.
+
+A scorer is any callable ``scorer(transaction, features, now)`` returning points. It gets
+the unsaved ``Transaction``, the account's ``AccountFeatures`` and the current Unix time.
+The default scorers below look at:
+
+- ``amount_anomaly``: the settlement amount against the account's mean and spread;
+- ``new_target``: a target never paid from the account;
+- ``velocity``: the number of transfers in the last hour, from the ``hour`` velocity
+  window of limits.py;
+- ``country_risk``: the points in ``RISK_COUNTRY_SCORES`` and ``RISK_PROVIDER_SCORES``.
+
+Features are kept per account in process memory and updated incrementally with every
+transaction that passes, once it is committed: the count, sum and sum of squares of the
+settlement amounts, and the last ``MAX_TARGETS`` distinct targets (hashed). The
+transactions of one batch are scored against the features as they were before the batch.
+
+This process's observations are merged into ``AccountRiskFeatures`` on the first commit
+``RISK_FEATURES_CHECKPOINT_INTERVAL`` seconds after the last merge, and at exit (see
+snapshots.py). Scoring reads an account's checkpoint the first time the process sees the
+account and again once its copy is older than that interval; otherwise it does not query
+the database. Features are therefore not shared between workers in real time: a worker
+scores against another worker's transactions only once that worker has merged them and
+this one has re-read the checkpoint.
+"""
+import hashlib
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import limits
+from .models import AccountRiskFeatures
+from .snapshots import AccountSnapshots
+
+logger = logging.getLogger(__name__)
+
+# Distinct targets remembered per account; the least recently paid one is dropped first.
+MAX_TARGETS = 200
+# Transfers an account needs before its amounts are compared with its history.
+MIN_HISTORY = 5
+# Transfers per hour that do not add points in ``velocity``.
+FREE_TRANSFERS_PER_HOUR = 10
+
+
+def target_key(transaction):
+    """Short hash of a transaction's target, or None when it has none."""
+    target = transaction.target_iban or transaction.target_bank_account_number or transaction.target_phone_number
+    if not target:
+        return None
+    return hashlib.blake2b(''.join(target.split()).upper().encode(), digest_size=8).hexdigest()
+
+
+class AccountFeatures:
+    """Incrementally maintained history of one account."""
+    __slots__ = ('count', 'total', 'total_squares', 'targets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.targets = {}       # target key -> None, oldest first
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self.total_squares / self.count - self.mean ** 2, 0.0))
+
+    def knows(self, target):
+        return target in self.targets
+
+    def observe(self, amount, target):
+        value = float(amount)
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        if target is not None:
+            self.targets.pop(target, None)
+            self.targets[target] = None
+            if len(self.targets) > MAX_TARGETS:
+                del self.targets[next(iter(self.targets))]
+
+    def dump(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'sum_squares': self.total_squares,
+            'targets': list(self.targets),
+        }
+
+    def load(self, data, now):
+        data = data or {}
+        self.count = data.get('count', 0)
+        self.total = data.get('sum', 0.0)
+        self.total_squares = data.get('sum_squares', 0.0)
+        self.targets = dict.fromkeys(data.get('targets', ()))
+
+
+# Default scorers.
+
+def amount_anomaly(transaction, features, now):
+    """Up to 40 points for an amount more than three standard deviations above the account's mean."""
+    if features.count < MIN_HISTORY:
+        return 0
+    mean = features.mean
+    spread = max(features.std, mean * 0.1, 1.0)
+    deviation = (float(transaction.settlement_amount) - mean) / spread
+    return min(40, 10 * (deviation - 2)) if deviation >= 3 else 0
+
+
+def new_target(transaction, features, now):
+    """25 points for a target the account never paid, 10 when the account has no history."""
+    target = target_key(transaction)
+    if target is None or features.knows(target):
+        return 0
+    return 25 if features.count else 10
+
+
+def velocity(transaction, features, now):
+    """3 points per transfer in the last hour beyond ``FREE_TRANSFERS_PER_HOUR``, up to 30."""
+    totals = limits.velocity.totals(transaction.source_account_id, 'hour', now)
+    if totals is None:
+        return 0
+    _, count = totals
+    return min(30, 3 * max(count - FREE_TRANSFERS_PER_HOUR + 1, 0))
+
+
+def country_risk(transaction, features, now):
+    """Points configured for the target country and mobile money provider."""
+    return (
+        settings.RISK_COUNTRY_SCORES.get(transaction.target_country, 0)
+        + settings.RISK_PROVIDER_SCORES.get(transaction.provider, 0)
+    )
+
+
+class RiskEngine:
+    """Scores transactions against per-account ``AccountFeatures``, checkpointed to ``AccountRiskFeatures``."""
+
+    def __init__(self):
+        self.features = AccountSnapshots(
+            AccountRiskFeatures, 'features', AccountFeatures, settings.RISK_FEATURES_CHECKPOINT_INTERVAL
+        )
+        self._scorers = (None, ())
+
+    @property
+    def scorers(self):
+        paths, scorers = self._scorers
+        if paths != settings.RISK_SCORERS:
+            paths = list(settings.RISK_SCORERS)
+            scorers = tuple(import_string(path) for path in paths)
+            self._scorers = (paths, scorers)
+        return scorers
+
+    def score_many(self, transactions, now=None):
+        """
+        Score unsaved transactions, setting ``risk_score`` and, over ``RISK_REJECT_SCORE``,
+        the ``failed`` status. Transactions that pass are added to their account's features
+        when the current DB transaction commits.
+
+        The features of accounts this process has not seen yet, or not re-read for
+        ``RISK_FEATURES_CHECKPOINT_INTERVAL`` seconds, are loaded with one query.
+        """
+        if not transactions:
+            return
+        now = time.time() if now is None else now
+        self.features.load({transaction.source_account_id for transaction in transactions}, now)
+
+        scorers = self.scorers
+        reject = settings.RISK_REJECT_SCORE
+        passed = []
+        with self.features.lock:
+            for transaction in transactions:
+                account_id = transaction.source_account_id
+                features = self.features.get(account_id)
+                points = sum(scorer(transaction, features, now) for scorer in scorers)
+                transaction.risk_score = max(0, min(100, round(points)))
+                if reject is not None and transaction.risk_score >= reject:
+                    logger.info("Transaction from account %s rejected with risk score %s", account_id, transaction.risk_score)
+                    transaction.status = 'failed'
+                else:
+                    passed.append(transaction)
+        for transaction in passed:
+            self.features.observe(transaction.source_account_id, transaction.settlement_amount, target_key(transaction))
+
+    def score(self, transaction):
+        """Score one unsaved transaction; returns its ``risk_score``."""
+        self.score_many([transaction])
+        return transaction.risk_score
+
+
+risk_engine = RiskEngine()
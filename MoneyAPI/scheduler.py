@@ -0,0 +1,162 @@
+# scheduler.py
+"""
+Scheduled and recurring transactions.
+
+A ``ScheduledTransaction`` holds the details of a transfer and when to make it: once at
+``starts_at``, or daily, weekly or monthly from then on until ``ends_at``. Monthly runs
+keep the day of month of ``starts_at`` (in UTC), moved back to the last day of shorter
+months.
+
+``manage.py run_scheduler`` calls ``run_due()`` in a loop. Each call claims a batch of
+due schedules in ``next_run_at`` order (served by the partial ``next_run_at`` index) with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so several scheduler processes can run side by
+side without picking the same schedule. The batch is turned into transactions with one
+bulk INSERT, their events with another, and the schedules are advanced with one bulk
+UPDATE, all in the DB transaction that holds the claim.
+
+Schedules tend to be created for round times (payroll at 09:00 on the 1st), so every
+schedule gets a random ``jitter`` of up to ``SCHEDULED_TRANSACTION_JITTER`` seconds when
+it is created, and all its runs happen that much after the nominal time. Runs are never
+early.
+
+A run whose currency has no rate any more, or that is over the source account's limits,
+still creates its transaction, with status ``failed``, so the partner sees it in the
+transaction list and the change feed. The runs of a batch that pass are risk-scored
+together (see risk.py), and fail as well when their score is too high. Only the runs
+created as ``pending`` count against the velocity limits, once the batch commits.
+
+Runs missed while no scheduler was running are not made up one by one: a schedule that
+is behind makes a single catch-up run on the next pass, and continues with its first
+occurrence after that run. A daily payout that missed a month pays out once, not 30
+times.
+"""
+import calendar
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import events
+from .fx import UnknownCurrency, fx_rates
+from .limits import LimitExceeded, check_transfer_limits, velocity
+from .models import ScheduledTransaction, Transaction
+from .risk import risk_engine
+from .transfers import build_transaction, transfer_details
+
+logger = logging.getLogger(__name__)
+
+RECURRENCE_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def new_jitter():
+    return random.randint(0, settings.SCHEDULED_TRANSACTION_JITTER)
+
+
+def add_months(value, months):
+    """``value`` moved by ``months`` months, the day clamped to the end of the month."""
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence(schedule, number):
+    """Nominal time of run ``number`` (from 0) of a schedule."""
+    if schedule.recurrence == 'monthly':
+        return add_months(schedule.starts_at, number)
+    return schedule.starts_at + timedelta(days=RECURRENCE_DAYS.get(schedule.recurrence, 0) * number)
+
+
+def first_occurrence_after(schedule, moment):
+    """Number of the first run of a recurring schedule due after ``moment``."""
+    moment -= timedelta(seconds=schedule.jitter)
+    if moment < schedule.starts_at:
+        return 0
+    if schedule.recurrence == 'monthly':
+        number = (moment.year - schedule.starts_at.year) * 12 + moment.month - schedule.starts_at.month
+    else:
+        number = (moment - schedule.starts_at) // timedelta(days=RECURRENCE_DAYS[schedule.recurrence])
+    while occurrence(schedule, number) <= moment:
+        number += 1
+    return number
+
+
+def next_run_at(schedule, after=None):
+    """
+    When the schedule runs next, or None when it is finished.
+
+    Args:
+        after (datetime): Time of the run just made; occurrences due up to then are skipped.
+            Without it, the first run of a new schedule.
+    """
+    if schedule.recurrence == 'once':
+        if schedule.runs:
+            return None
+        at = schedule.starts_at
+    else:
+        at = occurrence(schedule, 0 if after is None else first_occurrence_after(schedule, after))
+    if schedule.ends_at is not None and at > schedule.ends_at:
+        return None
+    return at + timedelta(seconds=schedule.jitter)
+
+
+def materialize(schedule, snapshot, reserved=None):
+    """
+    Unsaved transaction for the current run of a schedule.
+
+    ``reserved`` holds the transfers of the batch checked so far, so that runs from the
+    same account add up against its velocity limits (see limits.py).
+    """
+    details = transfer_details(schedule)
+    status, settlement_amount, fx_rate = 'pending', None, None
+    try:
+        settlement_amount, fx_rate = fx_rates.convert(schedule.amount, schedule.currency, snapshot)
+        check_transfer_limits(schedule.source_account_id, settlement_amount, reserved)
+    except (UnknownCurrency, LimitExceeded) as exc:
+        logger.warning("Scheduled transaction %s failed: %s", schedule.id, exc)
+        status = 'failed'
+    return build_transaction(
+        schedule.source_account_id, schedule.tenant_id, details, settlement_amount, fx_rate, status=status
+    )
+
+
+def run_due(now=None, batch_size=None):
+    """
+    Create the transactions of one batch of due schedules.
+
+    Args:
+        now (datetime): Schedules due at or before this run, defaults to now.
+        batch_size (int): Schedules per batch, defaults to SCHEDULED_TRANSACTION_BATCH_SIZE.
+
+    Returns:
+        int: Number of transactions created; less than ``batch_size`` when nothing else is due.
+    """
+    if now is None:
+        now = timezone.now()
+    if batch_size is None:
+        batch_size = settings.SCHEDULED_TRANSACTION_BATCH_SIZE
+    with events.batch():
+        schedules = list(
+            ScheduledTransaction.all_objects.filter(next_run_at__lte=now)
+            .order_by('next_run_at')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not schedules:
+            return 0
+        snapshot, reserved = fx_rates.snapshot, {}
+        transactions = [materialize(schedule, snapshot, reserved) for schedule in schedules]
+        risk_engine.score_many([transaction for transaction in transactions if transaction.status == 'pending'])
+        Transaction.all_objects.bulk_create(transactions)
+        for schedule, transaction in zip(schedules, transactions):
+            events.transaction_created(transaction)
+            if transaction.status == 'pending':
+                velocity.record(transaction.source_account_id, transaction.settlement_amount)
+            schedule.runs += 1
+            schedule.last_run_at = now
+            schedule.last_transaction_id = transaction.id
+            schedule.next_run_at = next_run_at(schedule, now)
+        ScheduledTransaction.all_objects.bulk_update(
+            schedules, ['runs', 'last_run_at', 'last_transaction_id', 'next_run_at']
+        )
+    return len(schedules)
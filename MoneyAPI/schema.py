@@ -1,6 +1,10 @@
 # schema.py
 from ninja import Schema
-from typing import Optional
+from pydantic import field_validator, model_validator
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from .registry import registry
+from . import validation
 
 
 class BankServerSchema(Schema):
@@ -23,11 +27,24 @@ class BankServerSchema(Schema):
     class Config:
         orm_mode = True
 
+class BankServerHealthSchema(Schema):
+    server_id: int
+    state: str  # 'closed', 'open' or 'half_open'
+    available: bool  # False while transactions for this server are parked in pending
+    error_rate: float  # Over the last `samples` calls and probes
+    samples: int
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    consecutive_failures: int
+    last_probe_at: Optional[str] = None
+    last_error: Optional[str] = None
+
 # Input schema
 class BankAccountCreateSchema(Schema):
     bank_server: int  # ID of the associated BankServer
     account_name: str
     account_number: str
+    tenant: Optional[int] = None  # Only with the master key; other keys create accounts of their own tenant
 
 # Output schema
 class BankAccountSchema(Schema):
@@ -45,6 +62,9 @@ class TransactionSchema(Schema):
     id: int
     transaction_type: str  # 'BANK' or 'MOBILE'
     amount: float
+    currency: str = 'USD'  # ISO 4217 code of `amount`
+    settlement_amount: Optional[float] = None  # `amount` converted to the settlement currency (USD)
+    fx_rate: Optional[float] = None  # Rate used for `settlement_amount`
     source_account: BankAccountSchema  # Nested schema for detailed account info
     target_iban: Optional[str] = None
     target_swift_code: Optional[str] = None
@@ -55,6 +75,9 @@ class TransactionSchema(Schema):
     provider: Optional[str] = None
     status: str  # 'pending', 'success', 'failed'
     created_at: str  # DateTime in ISO format
+    version: int = 0  # Incremented on each status change, also sent as the ETag header
+    duplicate_of: Optional[int] = None  # Earlier transaction this one likely duplicates
+    risk_score: Optional[int] = None  # 0-100, from the risk scorers at ingest
 
     class Config:
         orm_mode = True
@@ -63,13 +86,18 @@ class TransactionSchema(Schema):
     def from_transaction(transaction):
         """
         Convert a Transaction model instance to a TransactionSchema instance.
-        Ensures datetime is serialized as ISO strings.
+        Ensures datetime is serialized as ISO strings. The source account is read
+        from the in-memory registry when possible.
         """
+        source_account = registry.account(transaction.source_account_id) or transaction.source_account
         return TransactionSchema(
             id=transaction.id,
             transaction_type=transaction.transaction_type,
             amount=transaction.amount,
-            source_account=BankAccountSchema.from_orm(transaction.source_account),
+            currency=transaction.currency,
+            settlement_amount=transaction.settlement_amount,
+            fx_rate=transaction.fx_rate,
+            source_account=BankAccountSchema.from_orm(source_account),
             target_iban=transaction.target_iban,
             target_swift_code=transaction.target_swift_code,
             target_bank_account_number=transaction.target_bank_account_number,
@@ -79,12 +107,16 @@ class TransactionSchema(Schema):
             provider=transaction.provider,
             status=transaction.status,
             created_at=transaction.created_at.isoformat(),
+            version=transaction.version,
+            duplicate_of=transaction.duplicate_of,
+            risk_score=transaction.risk_score,
         )
 
 
 class TransactionCreateSchema(Schema):
     transaction_type: str  # 'BANK' or 'MOBILE'
     amount: float
+    currency: Optional[str] = None  # ISO 4217 code, defaults to the settlement currency (USD)
     source_account: int  # ID of the source BankAccount
     target_iban: Optional[str] = None
     target_swift_code: Optional[str] = None
@@ -97,9 +129,120 @@ class TransactionCreateSchema(Schema):
     class Config:
         orm_mode = True
 
+    @field_validator('currency')
+    @classmethod
+    def check_currency(cls, value):
+        if value is None:
+            return value
+        value = value.strip().upper()
+        if len(value) != 3 or not value.isalpha():
+            raise ValueError("currency must be a 3-letter ISO 4217 code, e.g. KES")
+        return value
+
+    # Targets are normalized and checked against the tables in validation.py.
+    @field_validator('target_iban')
+    @classmethod
+    def check_iban(cls, value):
+        return validation.normalize_iban(value) if value else value
+
+    @field_validator('target_swift_code')
+    @classmethod
+    def check_swift_code(cls, value):
+        return validation.normalize_bic(value) if value else value
+
+    @model_validator(mode='after')
+    def check_targets(self):
+        # Phone number, and the country/provider it implies; the IBAN is already normalized.
+        targets = validation.validate_target(
+            target_iban=self.target_iban,
+            target_phone_number=self.target_phone_number,
+            target_country=self.target_country,
+            provider=self.provider,
+        )
+        for name in ('target_phone_number', 'target_country', 'provider'):
+            setattr(self, name, targets[name])
+        return self
+
 
 class TransactionStatusUpdateSchema(Schema):
     status: str  # 'pending', 'success', 'failed'
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TransactionLookupSchema(Schema):
+    ids: List[int]  # Transaction IDs to fetch, at most TRANSACTION_LOOKUP_MAX_IDS
+
+
+class TransactionLookupResultSchema(Schema):
+    results: Dict[int, Optional[TransactionSchema]]  # null for IDs that do not exist
+    not_found: List[int]
+
+
+class TransactionEventSchema(Schema):
+    id: int  # Sequence number, use the last one seen as the next `after`
+    transaction_id: int
+    type: str  # 'created', 'status_changed' or 'deleted'
+    data: Dict[str, Any]  # 'created': the new transaction; otherwise only what changed
+    created_at: datetime
+
+
+class TransactionChangeSchema(Schema):
+    seq: int  # Change sequence number of the transaction's latest change
+    id: int
+    deleted: bool = False  # Tombstone: the transaction was deleted, `transaction` is null
+    transaction: Optional[TransactionSchema] = None
+
+
+class TransactionChangesSchema(Schema):
+    changes: List[TransactionChangeSchema]
+    next_since: int  # Pass as `since` to get the changes after these (best effort, see the endpoint)
+    has_more: bool  # More changes are waiting, call again right away
+
+
+class ScheduledTransactionCreateSchema(TransactionCreateSchema):
+    starts_at: datetime  # First run, in the future; UTC unless an offset is given
+    recurrence: str = 'once'  # 'once', 'daily', 'weekly' or 'monthly'
+    ends_at: Optional[datetime] = None  # No runs after this
+
+    @field_validator('recurrence')
+    @classmethod
+    def check_recurrence(cls, value):
+        if value not in ('once', 'daily', 'weekly', 'monthly'):
+            raise ValueError("recurrence must be one of: once, daily, weekly, monthly")
+        return value
+
+
+class ScheduledTransactionSchema(Schema):
+    id: int
+    transaction_type: str
+    amount: float
+    currency: str
+    source_account: BankAccountSchema
+    target_iban: Optional[str] = None
+    target_swift_code: Optional[str] = None
+    target_bank_account_number: Optional[str] = None
+    target_bank_name: Optional[str] = None
+    target_phone_number: Optional[str] = None
+    target_country: Optional[str] = None
+    provider: Optional[str] = None
+    recurrence: str
+    starts_at: datetime
+    ends_at: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None  # Includes the schedule's jitter; null once finished
+    runs: int
+    last_run_at: Optional[datetime] = None
+    last_transaction_id: Optional[int] = None  # Transaction created by the latest run
+    created_at: datetime
+
+    @staticmethod
+    def from_schedule(schedule):
+        """The source account is read from the in-memory registry when possible."""
+        source_account = registry.account(schedule.source_account_id) or schedule.source_account
+        return ScheduledTransactionSchema(
+            source_account=BankAccountSchema.from_orm(source_account),
+            **{
+                name: getattr(schedule, name)
+                for name in ScheduledTransactionSchema.model_fields if name != 'source_account'
+            },
+        )
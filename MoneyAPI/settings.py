@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,7 +44,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'MoneyAPI.middleware.ProbeMiddleware',
+    'MoneyAPI.middleware.TenantScopeMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'MoneyAPI.middleware.CompressionMiddleware',
+    'MoneyAPI.profiling.ProfilingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,6 +59,30 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Deployment profile, from the MONEYAPI_PROFILE environment variable:
+# - 'full' (default): API, admin and static files.
+# - 'api': pure API workers. Only what the /api/ routes need is installed (the API, CORS
+#   for browser clients, no admin, sessions or static files), which cuts worker start
+#   time and memory. Measure with `manage.py importtime_report --profile api`.
+DEPLOYMENT_PROFILE = os.environ.get('MONEYAPI_PROFILE', 'full')
+
+if DEPLOYMENT_PROFILE == 'api':
+    INSTALLED_APPS = [
+        'django.contrib.contenttypes',
+        'MoneyAPI',
+        'ninja',
+        "corsheaders",
+    ]
+    MIDDLEWARE = [
+        'MoneyAPI.middleware.ProbeMiddleware',
+        'MoneyAPI.middleware.TenantScopeMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'MoneyAPI.middleware.CompressionMiddleware',
+        'MoneyAPI.profiling.ProfilingMiddleware',
+        "corsheaders.middleware.CorsMiddleware",
+        'django.middleware.common.CommonMiddleware',
+    ]
+
 ROOT_URLCONF = 'MoneyAPI.urls'
 
 TEMPLATES = [
@@ -72,6 +101,12 @@ TEMPLATES = [
     },
 ]
 
+if DEPLOYMENT_PROFILE == 'api':
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ]
+
 WSGI_APPLICATION = 'MoneyAPI.wsgi.application'
 
 
@@ -130,9 +165,113 @@ MEDIA_ROOT = BASE_DIR/'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Transactions are settled in this currency; limits are in it too.
+SETTLEMENT_CURRENCY = 'USD'
+FX_RATES_TTL = 300  # Seconds before the in-memory FxRate snapshot is reloaded (see fx.py)
+
 MINIMUM_TRANSFER = 100
 MAXIMUM_TRANSFER = 200000000
 
+# Rolling per-account velocity limits, checked against in-memory counters (see limits.py).
+# Set 'amount' or 'count' to None to disable that limit for a window.
+VELOCITY_LIMITS = {
+    'hour': {'seconds': 60 * 60, 'amount': 50000000, 'count': 500},
+    'day': {'seconds': 24 * 60 * 60, 'amount': 200000000, 'count': 5000},
+}
+VELOCITY_SYNC_INTERVAL = 5  # Seconds between syncs of the counters to the database
+
+# Settled transactions older than this are moved to ArchivedTransaction by
+# `manage.py archive_transactions` (see archive.py).
+TRANSACTION_ARCHIVE_AFTER_DAYS = 90
+TRANSACTION_ARCHIVE_BATCH_SIZE = 1000
+
+# Deleted bank servers and accounts are soft-deleted, and physically removed with their
+# transactions by `manage.py purge_deleted` this many days later, in chunks (see deletion.py).
+DELETED_PURGE_AFTER_DAYS = 7
+DELETED_PURGE_BATCH_SIZE = 1000
+
+# Seconds before the in-memory BankServer/BankAccount registry is reloaded, to pick up
+# changes made by other worker processes (see registry.py).
+REGISTRY_TTL = 60
+# Seconds an id missing from the registry and the database is remembered as unknown.
+REGISTRY_MISS_TTL = 5
+
+# Bearer token that is not bound to a tenant and sees every tenant's data (see tenants.py).
+API_MASTER_KEY = os.environ.get('MONEYAPI_MASTER_KEY', '47061d41-7994-4fad-99a7-54879acd9a83')
+API_KEY_CACHE_TTL = 60  # Seconds before the in-memory API key table is reloaded
+
+# Circuit breakers per BankServer (see health.py).
+BANK_SERVER_HEALTH = {
+    'window': 100,                  # Calls/probes kept per server for the rolling stats
+    'min_calls': 10,                # Minimum calls in the window before the error rate can trip
+    'error_rate': 0.5,              # Error rate that opens the breaker
+    'consecutive_failures': 5,      # Consecutive failures that open the breaker
+    'slow_call_ms': 2000,           # Calls slower than this count as failures
+    'cooldown': 30,                 # Seconds an open breaker waits before going half-open
+    'probe_interval': 10,           # Seconds between background probes, 0 disables them
+    'probe_port': 443,
+    'probe_timeout': 2,
+}
+
+# Risk scoring at ingest (see risk.py): the scorers whose points are added up, the score
+# (0-100) from which a transaction is created as failed (None never rejects), extra points
+# per target country (ISO 3166 alpha-2) and mobile money provider, and seconds between
+# checkpoints of the per-account features to the database.
+RISK_SCORERS = [
+    'MoneyAPI.risk.amount_anomaly',
+    'MoneyAPI.risk.new_target',
+    'MoneyAPI.risk.velocity',
+    'MoneyAPI.risk.country_risk',
+]
+RISK_REJECT_SCORE = 90
+RISK_COUNTRY_SCORES = {}
+RISK_PROVIDER_SCORES = {}
+RISK_FEATURES_CHECKPOINT_INTERVAL = 5  # Seconds between merges and re-reads of the features (see snapshots.py)
+
+# Maximum number of ids accepted by POST /api/transactions/lookup.
+TRANSACTION_LOOKUP_MAX_IDS = 1000
+
+# Maximum number of events returned by one GET /api/transactions/events call.
+TRANSACTION_EVENTS_MAX_LIMIT = 10000
+
+# GET /api/transactions/changes: longest long-poll in seconds, how often a waiting
+# request re-checks the event log, and how old an event must be to be returned. The
+# delay has to cover the time between inserting an event and committing it (see events.py).
+TRANSACTION_CHANGES_MAX_WAIT = 30
+TRANSACTION_CHANGES_POLL_INTERVAL = 0.5
+TRANSACTION_CHANGES_SETTLE_DELAY = 2
+
+# Duplicate detection (see duplicates.py): a transaction with the same source account, target
+# and amount as one created in the last DUPLICATE_TRANSACTION_WINDOW seconds is rejected
+# with 409 ('reject') or created with `duplicate_of` set ('flag').
+DUPLICATE_TRANSACTION_WINDOW = 600
+DUPLICATE_TRANSACTION_POLICY = 'reject'
+
+# Scheduled transactions (see scheduler.py), run by `manage.py run_scheduler`: due schedules
+# claimed per batch, seconds between polls when nothing is due, and the largest random
+# delay added to each schedule's runs to spread out schedules due at the same time.
+SCHEDULED_TRANSACTION_BATCH_SIZE = 500
+SCHEDULER_POLL_INTERVAL = 5
+SCHEDULED_TRANSACTION_JITTER = 300
+
+# Seconds a /readyz database check is reused for (see middleware.ProbeMiddleware).
+READINESS_CHECK_TTL = 2
+
+# Responses smaller than this many bytes are sent uncompressed (see middleware.py).
+COMPRESSION_MIN_SIZE = 200
+
+# Per-request profiling (see profiling.py): requests sent with `X-Profile: <PROFILING_SECRET>`
+# (empty disables the header), plus a random PROFILING_SAMPLE_RATE share of all requests.
+# The last PROFILING_BUFFER_SIZE reports of each process are listed at /admin/profiles/.
+PROFILING_SECRET = os.environ.get('MONEYAPI_PROFILING_SECRET', '')
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_BUFFER_SIZE = 100
+
+# The OpenAPI document is generated once per API_VERSION and source change and cached
+# here (see openapi.py). Run `manage.py build_openapi` at build time to pre-generate it.
+API_VERSION = '1.0.0'
+OPENAPI_CACHE_DIR = BASE_DIR / 'openapi'
+
 CORS_ALLOW_ALL_ORIGINS: True
 
 CORS_ALLOWED_ORIGINS = [
@@ -0,0 +1,41 @@
+# signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .fx import fx_rates
+from .models import APIKey, BankServer, BankAccount, FxRate
+from .registry import registry
+from .tenants import api_keys
+
+
+@receiver(post_save, sender=BankServer)
+def bank_server_saved(sender, instance, **kwargs):
+    registry.server_saved(instance)
+
+
+@receiver(post_delete, sender=BankServer)
+def bank_server_deleted(sender, instance, **kwargs):
+    # Deleting a server cascades to its accounts, so start over.
+    registry.invalidate()
+
+
+@receiver(post_save, sender=BankAccount)
+def bank_account_saved(sender, instance, **kwargs):
+    registry.account_saved(instance)
+
+
+@receiver(post_delete, sender=BankAccount)
+def bank_account_deleted(sender, instance, **kwargs):
+    registry.account_deleted(instance.id)
+
+
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def fx_rate_changed(sender, instance, **kwargs):
+    fx_rates.invalidate()
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def api_key_changed(sender, instance, **kwargs):
+    api_keys.invalidate()
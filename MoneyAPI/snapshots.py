@@ -0,0 +1,175 @@
+# snapshots.py
+"""
+Process-local per-account state, synced to a table of per-account snapshots.
+
+limits.py (velocity windows) and risk.py (risk features) both keep some state per
+account in memory, updated incrementally with every transaction, and share it between
+processes through a table holding one JSON snapshot per account. ``AccountSnapshots``
+does the bookkeeping for both:
+
+- ``load()`` reads the snapshots of the accounts this process has not seen yet, or
+  last read more than ``interval`` seconds ago, with one query; ``get()`` then returns
+  an account's state. Accounts a process only reads are refreshed that way too.
+- ``observe()`` applies an observation to an account's state once the DB transaction
+  it belongs to commits, and keeps it for the next sync. Nothing is applied when the
+  transaction rolls back.
+- After a commit, once ``interval`` seconds have passed, ``sync()`` merges this
+  process's observations into the snapshots and reads the merged states back. It runs
+  outside the caller's DB transaction and is skipped while another thread is syncing.
+  A sync that fails keeps its observations for the next one.
+- ``sync_all()`` flushes every store at exit (registered with ``atexit``; ``serve`` and
+  ``run_scheduler`` call it themselves, as forked workers skip ``atexit``), so the last
+  observations of a process are not lost.
+
+A state is any object with ``observe(*observation)``, ``dump()`` returning what is stored
+in the snapshot, and ``load(snapshot, now)``.
+"""
+import atexit
+import logging
+import threading
+import time
+import weakref
+from functools import partial
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import BankAccount
+
+logger = logging.getLogger(__name__)
+
+# Every AccountSnapshots of the process, for sync_all().
+_stores = weakref.WeakSet()
+
+
+class AccountSnapshots:
+    """States of one kind for every account this process has seen, synced to ``model.field``."""
+
+    def __init__(self, model, field, new_state, interval):
+        self.model = model          # Has an ``account`` one-to-one, ``field`` and ``updated_at``
+        self.field = field
+        self.new_state = new_state  # Returns an empty state
+        self.interval = interval    # Seconds between syncs
+        self.lock = threading.Lock()    # Held while reading or changing states
+        self._states = {}
+        self._loaded_at = {}        # account id -> monotonic time its state was read from the DB
+        self._pending = {}          # account id -> observations not synced yet
+        self._syncing = {}          # account id -> observations being merged by a sync
+        self._sync_lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        _stores.add(self)
+
+    def load(self, account_ids, now):
+        """Load the snapshots of the accounts not loaded yet or loaded more than ``interval`` seconds ago."""
+        started = time.monotonic()
+        with self.lock:
+            stale = {
+                account_id for account_id in account_ids
+                if started - self._loaded_at.get(account_id, float('-inf')) >= self.interval
+            }
+        if not stale:
+            return
+        loaded = {account_id: self.new_state() for account_id in stale}
+        for account_id, snapshot in self.model.objects.filter(account_id__in=stale).values_list(
+            'account_id', self.field
+        ):
+            loaded[account_id].load(snapshot, now)
+        with self.lock:
+            for account_id, state in loaded.items():
+                if self._loaded_at.get(account_id, float('-inf')) >= started:
+                    continue    # Refreshed by a sync or another load in the meantime
+                # This process's observations are not in the snapshot yet. Those of a sync
+                # that committed since the read above are counted twice until it finishes.
+                for observation in self._syncing.get(account_id, []) + self._pending.get(account_id, []):
+                    state.observe(*observation)
+                self._states[account_id] = state
+                self._loaded_at[account_id] = started
+
+    def get(self, account_id):
+        """State of a loaded account. Use it while holding ``lock``: a sync replaces it."""
+        return self._states[account_id]
+
+    def observe(self, account_id, *observation):
+        """Apply an observation once the current DB transaction commits (right away outside one)."""
+        db_transaction.on_commit(partial(self._observe, account_id, observation))
+
+    def _observe(self, account_id, observation):
+        self.load([account_id], time.time())
+        with self.lock:
+            self._states[account_id].observe(*observation)
+            self._pending.setdefault(account_id, []).append(observation)
+
+        if time.monotonic() - self._last_sync >= self.interval:
+            self.sync()
+
+    def sync(self, blocking=False):
+        """
+        Merge pending observations into the snapshots and refresh local states.
+
+        Args:
+            blocking (bool): Wait for a sync running in another thread instead of skipping.
+        """
+        if not self._sync_lock.acquire(blocking=blocking):
+            return
+        try:
+            with self.lock:
+                self._last_sync = time.monotonic()
+                pending, self._pending = self._pending, {}
+                self._syncing = pending
+            if not pending:
+                return
+            try:
+                merged = self._merge(pending)
+            except Exception:
+                logger.exception(
+                    "Syncing %s failed, keeping %s accounts for the next sync", self.model.__name__, len(pending)
+                )
+                with self.lock:
+                    for account_id, observations in pending.items():
+                        self._pending[account_id] = observations + self._pending.get(account_id, [])
+                    self._syncing = {}
+                return
+
+            with self.lock:
+                loaded_at = time.monotonic()
+                for account_id, state in merged.items():
+                    # Observations made while the sync ran are not in the DB yet.
+                    for observation in self._pending.get(account_id, ()):
+                        state.observe(*observation)
+                    self._states[account_id] = state
+                    self._loaded_at[account_id] = loaded_at
+                self._syncing = {}
+        finally:
+            self._sync_lock.release()
+
+    def _merge(self, pending):
+        """Add pending observations to the stored snapshots; returns the merged states."""
+        now = time.time()
+        merged = {}
+        with db_transaction.atomic():
+            # Make sure every row exists, so all of them can be locked and merged into,
+            # including one another process is creating at the same time.
+            account_ids = list(BankAccount.all_objects.filter(id__in=pending).values_list('id', flat=True))
+            self.model.objects.bulk_create(
+                [self.model(account_id=account_id) for account_id in account_ids], ignore_conflicts=True
+            )
+            rows = list(self.model.objects.select_for_update().filter(account_id__in=account_ids))
+            for row in rows:
+                state = self.new_state()
+                state.load(getattr(row, self.field), now)
+                for observation in pending[row.account_id]:
+                    state.observe(*observation)
+                merged[row.account_id] = state
+                setattr(row, self.field, state.dump())
+                row.updated_at = timezone.now()
+            self.model.objects.bulk_update(rows, [self.field, 'updated_at'])
+        return merged
+
+
+def sync_all():
+    """Sync the pending observations of every store, waiting for syncs in progress."""
+    for store in list(_stores):
+        store.sync(blocking=True)
+
+
+atexit.register(sync_all)
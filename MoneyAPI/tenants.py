@@ -0,0 +1,108 @@
+# tenants.py
+"""
+API key authentication and tenant scoping.
+
+Every ``APIKey`` belongs to a ``Tenant``. A request authenticated with it only sees the
+bank accounts, transactions, schedules and events of that tenant. The scoping is not
+left to the endpoints: authentication stores the tenant in the ``current_tenant``
+context variable, and the default ``objects`` manager of those models (``TenantManager``
+in models.py) filters every queryset by it, which the ``(tenant, ...)`` indexes serve.
+``TenantScopeMiddleware`` clears it around every request. Querysets keep the filter
+they were built with, so a response streamed after the request has returned still
+only sees its tenant's rows. The ``API_MASTER_KEY`` from settings is not bound to a
+tenant and sees everything, as do the admin, the management commands and
+``all_objects``.
+
+Keys are checked against a process-local table of all keys, reloaded every
+``API_KEY_CACHE_TTL`` seconds and dropped when a key is saved or deleted in this process
+(see ``signals.py``), so authenticating a request does not query the database. A key
+created by another process is picked up on its first use with one indexed lookup.
+"""
+import threading
+import time
+from uuid import UUID
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from .models import APIKey
+
+# Unknown keys remembered between reloads, so repeated bad keys do not each cost a query.
+MAX_MISSES = 10000
+
+
+class Caller:
+    """The authenticated side of a request, available as ``request.auth``."""
+    __slots__ = ('tenant_id',)
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id      # None for the master key
+
+    @property
+    def is_master(self):
+        return self.tenant_id is None
+
+
+class APIKeyCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None       # str(api_key) -> tenant id
+        self._misses = set()
+        self._loaded_at = 0.0
+
+    def _state(self):
+        keys = self._keys
+        if keys is None or time.monotonic() - self._loaded_at > settings.API_KEY_CACHE_TTL:
+            # The table reload() built, even if invalidate() has dropped it again since.
+            keys = self.reload()
+        return keys
+
+    def reload(self):
+        """Load all keys with one query and swap them in. Returns the new table."""
+        keys = {
+            str(api_key): tenant_id
+            for api_key, tenant_id in APIKey.objects.filter(tenant__isnull=False).values_list('api_key', 'tenant_id')
+        }
+        with self._lock:
+            self._keys, self._misses = keys, set()
+            self._loaded_at = time.monotonic()
+        return keys
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+
+    def tenant_id(self, api_key):
+        """Tenant of a key in canonical UUID form, or None when the key is unknown."""
+        keys = self._state()
+        tenant_id = keys.get(api_key)
+        if tenant_id is not None or api_key in self._misses:
+            return tenant_id
+        tenant_id = (
+            APIKey.objects.filter(api_key=api_key, tenant__isnull=False)
+            .values_list('tenant_id', flat=True)
+            .first()
+        )
+        with self._lock:
+            if tenant_id is not None:
+                keys[api_key] = tenant_id
+            elif len(self._misses) < MAX_MISSES:
+                self._misses.add(api_key)
+        return tenant_id
+
+
+api_keys = APIKeyCache()
+
+
+def authenticate(token):
+    """Return the ``Caller`` for a bearer token, or None when the token is not a valid key."""
+    if settings.API_MASTER_KEY and constant_time_compare(token, settings.API_MASTER_KEY):
+        return Caller(None)
+    try:
+        api_key = str(UUID(token))
+    except ValueError:
+        return None
+    tenant_id = api_keys.tenant_id(api_key)
+    if tenant_id is None:
+        return None
+    return Caller(tenant_id)
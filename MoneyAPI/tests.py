@@ -0,0 +1,334 @@
+# tests.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import events
+from .limits import LimitExceeded, VelocityTracker
+from .models import (
+    APIKey, BankAccount, BankServer, ScheduledTransaction, Tenant, Transaction, TransactionEvent, current_tenant,
+)
+from .registry import registry
+from .scheduler import next_run_at, run_due
+from .tenants import api_keys
+
+
+# Fingerprints stay in this process's memory between tests, whose rows are rolled back.
+@override_settings(DUPLICATE_TRANSACTION_WINDOW=0)
+class APITestCase(TestCase):
+    """Two tenants with an API key and an account each; the process-local caches start empty."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.server = BankServer.objects.create(name='Main Bank Server', server_ip_address='192.168.1.100')
+        cls.tenants, cls.keys, cls.accounts = [], [], []
+        for n in range(2):
+            tenant = Tenant.objects.create(name=f'Tenant {n}')
+            cls.tenants.append(tenant)
+            cls.keys.append(APIKey.objects.create(tenant=tenant).api_key)
+            cls.accounts.append(BankAccount.objects.create(
+                bank_server=cls.server, tenant=tenant, account_name=f'Account {n}', account_number=f'10{n}'
+            ))
+
+    def setUp(self):
+        # Rolled-back rows of earlier tests may still be cached, and their ids reused.
+        registry.invalidate()
+        api_keys.invalidate()
+
+    def request(self, method, path, key, data=None, **headers):
+        return getattr(self.client, method)(
+            path, data, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {key}', **headers
+        )
+
+    def create_transaction(self, key, account, amount=150):
+        return self.request('post', '/api/transactions', key, {
+            'source_account': account.id,
+            'transaction_type': 'MOBILE',
+            'amount': amount,
+            'target_phone_number': '+254712345678',
+        })
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), "The admin is not installed in this deployment profile")
+class TransactionAdminQueriesTest(TestCase):
+    """The transaction changelist runs a fixed number of queries, however many rows it lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        server = BankServer.objects.create(name='Main Bank Server', server_ip_address='192.168.1.100')
+        accounts = [
+            BankAccount.objects.create(bank_server=server, account_name=f'Account {n}', account_number=f'10{n}')
+            for n in range(3)
+        ]
+        transactions = Transaction.objects.bulk_create(
+            Transaction(
+                source_account=accounts[n % len(accounts)],
+                transaction_type='MOBILE',
+                amount=Decimal('150.00'),
+                settlement_amount=Decimal('150.00'),
+                target_phone_number=f'+25471234{n:04d}',
+                status='pending',
+            )
+            for n in range(30)
+        )
+        # Half of them on January 1st, so the date hierarchy has more than one month this year.
+        Transaction.objects.filter(id__in=[transaction.id for transaction in transactions[::2]]).update(
+            created_at=timezone.now().replace(month=1, day=1)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_changelist_with_search_and_date_hierarchy(self):
+        year = timezone.now().year
+        # Session, user, the tenants of the tenant filter, the exact count of the filtered
+        # rows, the page with its source accounts joined in, and the date hierarchy's months.
+        with self.assertNumQueries(6):
+            response = self.client.get(
+                '/admin/MoneyAPI/transaction/', {'q': '+2547123', 'created_at__year': year}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 30)
+
+
+class TenantIsolationTest(APITestCase):
+    """An API key only sees and uses its own tenant's accounts and transactions."""
+
+    def setUp(self):
+        super().setUp()
+        response = self.create_transaction(self.keys[0], self.accounts[0])
+        self.assertEqual(response.status_code, 200)
+        self.transaction_id = response.json()['id']
+
+    def test_get_from_other_tenant_is_not_found(self):
+        self.assertEqual(self.request('get', f'/api/transactions/{self.transaction_id}', self.keys[0]).status_code, 200)
+        self.assertEqual(self.request('get', f'/api/transactions/{self.transaction_id}', self.keys[1]).status_code, 404)
+        self.assertEqual(self.request('get', f'/api/bank-accounts/{self.accounts[0].id}', self.keys[1]).status_code, 404)
+
+    def test_list_from_other_tenant_is_empty(self):
+        self.assertEqual(len(self.request('get', '/api/transactions', self.keys[0]).json()), 1)
+        self.assertEqual(self.request('get', '/api/transactions', self.keys[1]).json(), [])
+        self.assertEqual(
+            [account['id'] for account in self.request('get', '/api/bank-accounts', self.keys[1]).json()],
+            [self.accounts[1].id],
+        )
+
+    def test_other_tenants_account_cannot_be_debited(self):
+        self.assertEqual(self.create_transaction(self.keys[1], self.accounts[0]).status_code, 404)
+        self.assertEqual(Transaction.all_objects.count(), 1)
+
+    def test_status_update_from_other_tenant_is_not_found(self):
+        response = self.request(
+            'put', f'/api/transactions/{self.transaction_id}/status', self.keys[1], {'status': 'success'}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Transaction.all_objects.get(id=self.transaction_id).status, 'pending')
+
+    def test_scope_is_cleared_after_the_request(self):
+        self.request('get', '/api/transactions', self.keys[1])
+        self.assertIsNone(current_tenant.get())
+
+
+class TransactionStatusTest(APITestCase):
+    """Status changes are one conditional UPDATE: a stale or repeated change gets 409."""
+
+    def setUp(self):
+        super().setUp()
+        self.transaction_id = self.create_transaction(self.keys[0], self.accounts[0]).json()['id']
+        self.path = f'/api/transactions/{self.transaction_id}/status'
+
+    def test_settle_bumps_version(self):
+        response = self.request('put', self.path, self.keys[0], {'status': 'success'}, HTTP_IF_MATCH='"0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(
+            list(TransactionEvent.all_objects.filter(transaction_id=self.transaction_id).values_list('type', flat=True)),
+            [TransactionEvent.CREATED, TransactionEvent.STATUS_CHANGED],
+        )
+
+    def test_stale_if_match_conflicts(self):
+        response = self.request('put', self.path, self.keys[0], {'status': 'success'}, HTTP_IF_MATCH='"5"')
+        self.assertEqual(response.status_code, 409)
+        transaction = Transaction.all_objects.get(id=self.transaction_id)
+        self.assertEqual((transaction.status, transaction.version), ('pending', 0))
+
+    def test_second_settlement_conflicts(self):
+        self.assertEqual(self.request('put', self.path, self.keys[0], {'status': 'success'}).status_code, 200)
+        response = self.request('put', self.path, self.keys[0], {'status': 'failed'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Transaction.all_objects.get(id=self.transaction_id).status, 'success')
+
+    def test_unknown_status_is_rejected(self):
+        self.assertEqual(self.request('put', self.path, self.keys[0], {'status': 'pending'}).status_code, 400)
+
+
+class VelocityTrackerTest(TestCase):
+    """Transfers count against the windows once committed, never when checked or rolled back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        server = BankServer.objects.create(name='Main Bank Server', server_ip_address='192.168.1.100')
+        cls.account = BankAccount.objects.create(bank_server=server, account_name='Account', account_number='100')
+
+    def setUp(self):
+        self.tracker = VelocityTracker(
+            limits={'minute': {'seconds': 60, 'amount': Decimal(1000), 'count': 2}}, sync_interval=3600
+        )
+
+    def test_check_does_not_count(self):
+        self.tracker.check(self.account.id, Decimal(100))
+        self.assertEqual(self.tracker.totals(self.account.id, 'minute'), (Decimal(0), 0))
+
+    def test_record_counts_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracker.record(self.account.id, Decimal(100))
+            self.assertEqual(self.tracker.totals(self.account.id, 'minute'), (Decimal(0), 0))
+        self.assertEqual(self.tracker.totals(self.account.id, 'minute'), (Decimal(100), 1))
+
+    def test_rolled_back_record_is_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with db_transaction.atomic():
+                    self.tracker.record(self.account.id, Decimal(100))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.tracker.totals(self.account.id, 'minute'), (Decimal(0), 0))
+
+    def test_limits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracker.record(self.account.id, Decimal(100))
+        with self.assertRaises(LimitExceeded):
+            self.tracker.check(self.account.id, Decimal(901))
+        # Transfers reserved earlier in the same batch count too.
+        reserved = {}
+        self.tracker.check(self.account.id, Decimal(100), reserved=reserved)
+        self.assertEqual(reserved, {self.account.id: (Decimal(100), 1)})
+        with self.assertRaises(LimitExceeded):
+            self.tracker.check(self.account.id, Decimal(100), reserved=reserved)
+
+
+class RegistryTest(TestCase):
+    """The registry falls back to the database for accounts it does not hold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.server = BankServer.objects.create(name='Main Bank Server', server_ip_address='192.168.1.100')
+
+    def setUp(self):
+        registry.reload()
+
+    def test_account_created_elsewhere_is_found(self):
+        # bulk_create sends no signal, like a save in another process.
+        account, = BankAccount.objects.bulk_create([
+            BankAccount(bank_server=self.server, account_name='Account', account_number='100')
+        ])
+        self.assertEqual(registry.account(account.id).account_number, '100')
+        with self.assertNumQueries(0):
+            registry.account(account.id)
+
+    def test_unknown_account_is_remembered(self):
+        self.assertIsNone(registry.account(12345))
+        with self.assertNumQueries(0):
+            self.assertIsNone(registry.account(12345))
+
+    def test_account_deleted_elsewhere_is_rejected(self):
+        account = BankAccount.objects.create(bank_server=self.server, account_name='Account', account_number='100')
+        self.assertIsNotNone(registry.account(account.id))
+        BankAccount.objects.filter(id=account.id).update(deleted_at=timezone.now())
+        with self.assertRaises(Http404):
+            registry.get_account_or_404(account.id)
+        self.assertIsNone(registry.account(account.id))
+
+
+class NextRunTest(SimpleTestCase):
+    """Missed occurrences are skipped, not replayed."""
+
+    starts_at = datetime(2024, 1, 31, 9, 0, tzinfo=dt_timezone.utc)
+
+    def schedule(self, recurrence, **fields):
+        return ScheduledTransaction(recurrence=recurrence, starts_at=self.starts_at, **fields)
+
+    def test_first_run(self):
+        self.assertEqual(next_run_at(self.schedule('daily', jitter=30)), self.starts_at + timedelta(seconds=30))
+
+    def test_once_runs_once(self):
+        self.assertIsNone(next_run_at(self.schedule('once', runs=1), self.starts_at))
+
+    def test_missed_runs_are_skipped(self):
+        after = self.starts_at + timedelta(days=10, hours=1)
+        self.assertEqual(next_run_at(self.schedule('daily', runs=1), after), self.starts_at + timedelta(days=11))
+
+    def test_monthly_clamps_to_the_end_of_the_month(self):
+        self.assertEqual(
+            next_run_at(self.schedule('monthly', runs=1), self.starts_at),
+            datetime(2024, 2, 29, 9, 0, tzinfo=dt_timezone.utc),
+        )
+
+    def test_ends_at(self):
+        schedule = self.schedule('daily', runs=1, ends_at=self.starts_at + timedelta(hours=1))
+        self.assertIsNone(next_run_at(schedule, self.starts_at))
+
+
+class RunDueTest(APITestCase):
+    """A schedule that fell behind makes one run, then waits for its next occurrence."""
+
+    def test_catch_up_makes_one_run(self):
+        now = timezone.now()
+        schedule = ScheduledTransaction(
+            source_account=self.accounts[0], tenant=self.tenants[0], recurrence='daily',
+            starts_at=now - timedelta(days=3, minutes=1), transaction_type='MOBILE', amount=Decimal(150),
+            target_phone_number='+254712345678',
+        )
+        schedule.next_run_at = next_run_at(schedule)
+        schedule.save()
+
+        self.assertEqual(run_due(now=now), 1)
+        self.assertEqual(run_due(now=now), 0)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.runs, 1)
+        self.assertEqual(schedule.next_run_at, schedule.starts_at + timedelta(days=4))
+        transaction = Transaction.all_objects.get(id=schedule.last_transaction_id)
+        self.assertEqual((transaction.tenant_id, transaction.status), (self.tenants[0].id, 'pending'))
+
+
+class TransactionChangesTest(APITestCase):
+    """The change feed returns settled changes once per transaction, resumable from ``next_since``."""
+
+    def settle(self):
+        TransactionEvent.all_objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+    def test_unsettled_changes_are_held_back(self):
+        self.create_transaction(self.keys[0], self.accounts[0])
+        self.assertEqual(events.changes(), [])
+        self.settle()
+        self.assertEqual(len(events.changes()), 1)
+
+    def test_checkpoint(self):
+        first = self.create_transaction(self.keys[0], self.accounts[0]).json()['id']
+        second = self.create_transaction(self.keys[0], self.accounts[0], amount=200).json()['id']
+        self.request('put', f'/api/transactions/{first}/status', self.keys[0], {'status': 'success'})
+        self.settle()
+
+        page = self.request('get', '/api/transactions/changes', self.keys[0], {'limit': 1}).json()
+        self.assertEqual([change['id'] for change in page['changes']], [second])
+        self.assertTrue(page['has_more'])
+        page = self.request('get', '/api/transactions/changes', self.keys[0], {'since': page['next_since']}).json()
+        self.assertEqual([change['id'] for change in page['changes']], [first])
+        self.assertEqual(page['changes'][0]['transaction']['status'], 'success')
+        page = self.request('get', '/api/transactions/changes', self.keys[0], {'since': page['next_since']}).json()
+        self.assertEqual(page['changes'], [])
+
+    def test_other_tenants_changes_are_not_listed(self):
+        self.create_transaction(self.keys[0], self.accounts[0])
+        self.settle()
+        self.assertEqual(self.request('get', '/api/transactions/changes', self.keys[1]).json()['changes'], [])
@@ -0,0 +1,57 @@
+# transfers.py
+"""
+Building ``Transaction`` rows from transfer details.
+
+``create_transaction`` and the scheduler (see scheduler.py) both turn a set of transfer
+details (type, amount, currency, target) into a new transaction; both go through
+``build_transaction`` so the two paths fill in the same fields.
+"""
+from .duplicates import fingerprint
+from .models import Transaction
+
+# The fields of a TransferDetails model; what a transfer is made of.
+TRANSFER_FIELDS = (
+    'transaction_type', 'amount', 'currency', 'target_iban', 'target_swift_code',
+    'target_bank_account_number', 'target_bank_name', 'target_phone_number', 'target_country',
+    'provider',
+)
+
+
+def transfer_details(source):
+    """The ``TRANSFER_FIELDS`` of a schema or model instance, as a dict."""
+    return {name: getattr(source, name) for name in TRANSFER_FIELDS}
+
+
+def transfer_fingerprint(source_account_id, details):
+    """Duplicate-detection fingerprint of transfer details (see duplicates.py)."""
+    return fingerprint(
+        source_account_id, details['amount'], details['currency'], details['target_iban'],
+        details['target_bank_account_number'], details['target_phone_number'],
+    )
+
+
+def build_transaction(source_account_id, tenant_id, details, settlement_amount, fx_rate, status='pending',
+                      **fields):
+    """
+    Return a new, unsaved ``Transaction``.
+
+    Args:
+        source_account_id (int): ID of the source BankAccount.
+        tenant_id (int): Tenant of the source account.
+        details (dict): ``TRANSFER_FIELDS``, ``amount`` as a Decimal in ``currency``.
+        settlement_amount (Decimal): ``amount`` in SETTLEMENT_CURRENCY (see fx.py).
+        fx_rate (Decimal): Rate used for ``settlement_amount``.
+        status (str): Initial status.
+        **fields: Other Transaction fields, e.g. ``duplicate_of``. ``fingerprint`` is
+            computed from the details unless given.
+    """
+    fields.setdefault('fingerprint', transfer_fingerprint(source_account_id, details))
+    return Transaction(
+        source_account_id=source_account_id,
+        tenant_id=tenant_id,
+        settlement_amount=settlement_amount,
+        fx_rate=fx_rate,
+        status=status,
+        **details,
+        **fields,
+    )
@@ -14,12 +14,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path
 from .api import api
+from .openapi import openapi_json
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Precomputed document, served ahead of the one ninja would build at runtime.
+    path("api/openapi.json", openapi_json),
     path("api/", api.urls)
 ]
+
+# Not installed in the API-only deployment profile.
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    from .views import profile_detail, profile_list
+
+    urlpatterns[:0] = [
+        path('admin/profiles/', admin.site.admin_view(profile_list), name='profile_list'),
+        path('admin/profiles/<int:report_id>/', admin.site.admin_view(profile_detail), name='profile_detail'),
+        path('admin/', admin.site.urls),
+    ]
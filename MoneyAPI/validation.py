@@ -0,0 +1,201 @@
+# validation.py
+"""
+Validation and normalization of transaction targets.
+
+Everything is checked against tables built once at import time, so validating a target
+is a few dict lookups and one integer modulo:
+
+- IBAN: country code, the country's IBAN length and the ISO 7064 mod-97 check digits.
+- BIC/SWIFT code: 8 or 11 characters, bank code, a known country code and location.
+- Phone numbers: E.164 (``+`` and 8 to 15 digits), with the country taken from the
+  calling code and, for mobile money networks we know, the provider from the number
+  prefix.
+
+The ``normalize_*`` functions return the canonical form of a value or raise
+``ValueError``; they are used by the pydantic validators of ``TransactionCreateSchema``.
+"""
+import re
+
+# IBAN length per country (SWIFT IBAN registry).
+IBAN_LENGTHS = {
+    'AD': 24, 'AE': 23, 'AL': 28, 'AT': 20, 'AZ': 28, 'BA': 20, 'BE': 16, 'BG': 22, 'BH': 22,
+    'BI': 27, 'BR': 29, 'BY': 28, 'CH': 21, 'CR': 22, 'CY': 28, 'CZ': 24, 'DE': 22, 'DJ': 27,
+    'DK': 18, 'DO': 28, 'EE': 20, 'EG': 29, 'ES': 24, 'FI': 18, 'FK': 18, 'FO': 18, 'FR': 27,
+    'GB': 22, 'GE': 22, 'GI': 23, 'GL': 18, 'GR': 27, 'GT': 28, 'HR': 21, 'HU': 28, 'IE': 22,
+    'IL': 23, 'IQ': 23, 'IS': 26, 'IT': 27, 'JO': 30, 'KW': 30, 'KZ': 20, 'LB': 28, 'LC': 32,
+    'LI': 21, 'LT': 20, 'LU': 20, 'LV': 21, 'LY': 25, 'MC': 27, 'MD': 24, 'ME': 22, 'MK': 19,
+    'MN': 20, 'MR': 27, 'MT': 31, 'MU': 30, 'NI': 28, 'NL': 18, 'NO': 15, 'OM': 23, 'PK': 24,
+    'PL': 28, 'PS': 29, 'PT': 25, 'QA': 29, 'RO': 24, 'RS': 22, 'RU': 33, 'SA': 24, 'SC': 31,
+    'SD': 18, 'SE': 24, 'SI': 19, 'SK': 24, 'SM': 27, 'SO': 23, 'ST': 25, 'SV': 28, 'TL': 23,
+    'TN': 24, 'TR': 26, 'UA': 29, 'VA': 22, 'VG': 24, 'XK': 20, 'YE': 30,
+}
+
+# E.164 calling code -> ISO 3166 country codes sharing it.
+CALLING_CODES = {
+    '1': ('US', 'CA'), '7': ('RU', 'KZ'), '20': ('EG',), '27': ('ZA',), '30': ('GR',), '31': ('NL',),
+    '32': ('BE',), '33': ('FR',), '34': ('ES',), '36': ('HU',), '39': ('IT', 'VA'), '40': ('RO',),
+    '41': ('CH',), '43': ('AT',), '44': ('GB',), '45': ('DK',), '46': ('SE',), '47': ('NO',),
+    '48': ('PL',), '49': ('DE',), '51': ('PE',), '52': ('MX',), '53': ('CU',), '54': ('AR',),
+    '55': ('BR',), '56': ('CL',), '57': ('CO',), '58': ('VE',), '60': ('MY',), '61': ('AU',),
+    '62': ('ID',), '63': ('PH',), '64': ('NZ',), '65': ('SG',), '66': ('TH',), '81': ('JP',),
+    '82': ('KR',), '84': ('VN',), '86': ('CN',), '90': ('TR',), '91': ('IN',), '92': ('PK',),
+    '93': ('AF',), '94': ('LK',), '95': ('MM',), '98': ('IR',), '211': ('SS',), '212': ('MA',),
+    '213': ('DZ',), '216': ('TN',), '218': ('LY',), '220': ('GM',), '221': ('SN',), '222': ('MR',),
+    '223': ('ML',), '224': ('GN',), '225': ('CI',), '226': ('BF',), '227': ('NE',), '228': ('TG',),
+    '229': ('BJ',), '230': ('MU',), '231': ('LR',), '232': ('SL',), '233': ('GH',), '234': ('NG',),
+    '235': ('TD',), '236': ('CF',), '237': ('CM',), '238': ('CV',), '239': ('ST',), '240': ('GQ',),
+    '241': ('GA',), '242': ('CG',), '243': ('CD',), '244': ('AO',), '245': ('GW',), '248': ('SC',),
+    '249': ('SD',), '250': ('RW',), '251': ('ET',), '252': ('SO',), '253': ('DJ',), '254': ('KE',),
+    '255': ('TZ',), '256': ('UG',), '257': ('BI',), '258': ('MZ',), '260': ('ZM',), '261': ('MG',),
+    '263': ('ZW',), '264': ('NA',), '265': ('MW',), '266': ('LS',), '267': ('BW',), '268': ('SZ',),
+    '269': ('KM',), '291': ('ER',), '297': ('AW',), '298': ('FO',), '299': ('GL',), '350': ('GI',),
+    '351': ('PT',), '352': ('LU',), '353': ('IE',), '354': ('IS',), '355': ('AL',), '356': ('MT',),
+    '357': ('CY',), '358': ('FI',), '359': ('BG',), '370': ('LT',), '371': ('LV',), '372': ('EE',),
+    '373': ('MD',), '374': ('AM',), '375': ('BY',), '376': ('AD',), '377': ('MC',), '378': ('SM',),
+    '380': ('UA',), '381': ('RS',), '382': ('ME',), '383': ('XK',), '385': ('HR',), '386': ('SI',),
+    '387': ('BA',), '389': ('MK',), '420': ('CZ',), '421': ('SK',), '423': ('LI',), '500': ('FK',),
+    '501': ('BZ',), '502': ('GT',), '503': ('SV',), '504': ('HN',), '505': ('NI',), '506': ('CR',),
+    '507': ('PA',), '509': ('HT',), '591': ('BO',), '592': ('GY',), '593': ('EC',), '595': ('PY',),
+    '597': ('SR',), '598': ('UY',), '670': ('TL',), '673': ('BN',), '675': ('PG',), '679': ('FJ',),
+    '852': ('HK',), '853': ('MO',), '855': ('KH',), '856': ('LA',), '880': ('BD',), '886': ('TW',),
+    '960': ('MV',), '961': ('LB',), '962': ('JO',), '963': ('SY',), '964': ('IQ',), '965': ('KW',),
+    '966': ('SA',), '967': ('YE',), '968': ('OM',), '970': ('PS',), '971': ('AE',), '972': ('IL',),
+    '973': ('BH',), '974': ('QA',), '975': ('BT',), '976': ('MN',), '977': ('NP',), '992': ('TJ',),
+    '993': ('TM',), '994': ('AZ',), '995': ('GE',), '996': ('KG',), '998': ('UZ',),
+}
+
+# Mobile money networks by national number prefix, for the markets we pay out to.
+MOBILE_PROVIDERS = {
+    '254': {
+        '70': 'Safaricom', '71': 'Safaricom', '72': 'Safaricom', '74': 'Safaricom', '79': 'Safaricom',
+        '11': 'Safaricom', '73': 'Airtel', '75': 'Airtel', '78': 'Airtel', '10': 'Airtel',
+    },
+    '256': {'76': 'MTN', '77': 'MTN', '78': 'MTN', '70': 'Airtel', '74': 'Airtel', '75': 'Airtel'},
+    '255': {
+        '74': 'Vodacom', '75': 'Vodacom', '76': 'Vodacom', '68': 'Airtel', '69': 'Airtel', '78': 'Airtel',
+        '65': 'Tigo', '67': 'Tigo', '71': 'Tigo', '62': 'Halotel',
+    },
+    '250': {'78': 'MTN', '79': 'MTN', '72': 'Airtel', '73': 'Airtel'},
+    '233': {
+        '24': 'MTN', '53': 'MTN', '54': 'MTN', '55': 'MTN', '59': 'MTN', '20': 'Vodafone', '50': 'Vodafone',
+        '26': 'AirtelTigo', '27': 'AirtelTigo', '56': 'AirtelTigo', '57': 'AirtelTigo',
+    },
+    '260': {'76': 'MTN', '96': 'MTN', '77': 'Airtel', '97': 'Airtel', '95': 'Zamtel'},
+}
+
+# ISO 3166-1 alpha-2 codes, plus XK (Kosovo) as used by IBANs and SWIFT codes.
+COUNTRIES = frozenset("""
+    AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR BS BT BV BW BY BZ
+    CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO FR
+    GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE JM JO JP
+    KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS MT
+    MU MV MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW PY QA RE RO RS RU RW
+    SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF TG TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG
+    UM US UY UZ VA VC VE VG VI VN VU WF WS XK YE YT ZA ZM ZW
+""".split())
+
+# Letters to their mod-97 digit values (A=10 ... Z=35).
+_IBAN_DIGITS = str.maketrans({chr(code): str(code - 55) for code in range(ord('A'), ord('Z') + 1)})
+_IBAN_RE = re.compile(r'[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}')
+_BIC_RE = re.compile(r'[A-Z]{4}([A-Z]{2})[A-Z0-9]{2}(?:[A-Z0-9]{3})?')
+_PHONE_RE = re.compile(r'\+?[0-9]{8,15}')
+_PHONE_SEPARATORS = str.maketrans('', '', ' -().')
+
+
+def normalize_iban(value):
+    """Return the IBAN without spaces, uppercase; raise ValueError if it is not valid."""
+    iban = ''.join(value.split()).upper()
+    if not _IBAN_RE.fullmatch(iban):
+        raise ValueError("IBAN must be a country code, 2 check digits and up to 30 letters or digits")
+    length = IBAN_LENGTHS.get(iban[:2])
+    if length is None:
+        raise ValueError(f"IBANs are not used in country '{iban[:2]}'")
+    if len(iban) != length:
+        raise ValueError(f"IBANs of country '{iban[:2]}' have {length} characters, not {len(iban)}")
+    if int((iban[4:] + iban[:4]).translate(_IBAN_DIGITS)) % 97 != 1:
+        raise ValueError("IBAN check digits do not match")
+    return iban
+
+
+def normalize_bic(value):
+    """Return the BIC/SWIFT code uppercase; raise ValueError if it is not valid."""
+    bic = ''.join(value.split()).upper()
+    match = _BIC_RE.fullmatch(bic)
+    if match is None:
+        raise ValueError("SWIFT code must be 8 or 11 characters: bank, country, location and optional branch")
+    if match.group(1) not in COUNTRIES:
+        raise ValueError(f"Unknown country '{match.group(1)}' in SWIFT code")
+    return bic
+
+
+def parse_phone(value):
+    """
+    Normalize a phone number to E.164.
+
+    Returns:
+        tuple: ``(number, countries, provider)``: the number as ``+`` and digits, the
+        countries of its calling code (empty when unknown) and the mobile money network
+        (None when unknown).
+
+    Raises:
+        ValueError: The number is not a valid E.164 number.
+    """
+    number = value.strip().translate(_PHONE_SEPARATORS)
+    if number.startswith('00'):
+        number = '+' + number[2:]
+    if not number.startswith('+') or not _PHONE_RE.fullmatch(number):
+        raise ValueError("Phone number must be in international format, e.g. +254712345678")
+    digits = number[1:]
+    for size in (1, 2, 3):
+        countries = CALLING_CODES.get(digits[:size])
+        if countries is not None:
+            networks = MOBILE_PROVIDERS.get(digits[:size], {})
+            return number, countries, networks.get(digits[size:size + 2])
+    return number, (), None
+
+
+def normalize_country(value):
+    """Uppercase two-letter country codes; country names are kept as given."""
+    country = value.strip()
+    return country.upper() if len(country) == 2 else country
+
+
+def validate_target(target_iban=None, target_swift_code=None, target_phone_number=None,
+                    target_country=None, provider=None):
+    """
+    Validate and normalize the targets of one transaction.
+
+    The country is filled in from the IBAN or phone number when not given, and so is the
+    provider for known mobile money networks. A two-letter ``target_country`` has to
+    agree with them.
+
+    Returns:
+        dict: The normalized values of the five fields.
+
+    Raises:
+        ValueError: On the first invalid field.
+    """
+    derived = None
+    if target_iban:
+        target_iban = normalize_iban(target_iban)
+        derived = (target_iban[:2],)
+    if target_swift_code:
+        target_swift_code = normalize_bic(target_swift_code)
+    if target_phone_number:
+        target_phone_number, countries, network = parse_phone(target_phone_number)
+        derived = derived or countries or None
+        provider = provider or network
+    if target_country:
+        target_country = normalize_country(target_country)
+        if derived and len(target_country) == 2 and target_country not in derived:
+            raise ValueError(f"target_country '{target_country}' does not match the target ({'/'.join(derived)})")
+    elif derived and len(derived) == 1:
+        target_country = derived[0]
+    return {
+        'target_iban': target_iban,
+        'target_swift_code': target_swift_code,
+        'target_phone_number': target_phone_number,
+        'target_country': target_country,
+        'provider': provider,
+    }
+
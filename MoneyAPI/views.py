@@ -0,0 +1,29 @@
+# views.py
+from django.contrib import admin
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from .profiling import reports
+
+
+def profile_list(request):
+    """Admin page listing the request profiles kept by this process (see profiling.py)."""
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'reports': reports.all(),
+    }
+    return TemplateResponse(request, 'admin/profiles/list.html', context)
+
+
+def profile_detail(request, report_id):
+    report = reports.get(report_id)
+    if report is None:
+        raise Http404("No profile with this id; it may have left the buffer or belong to another worker.")
+    context = {
+        **admin.site.each_context(request),
+        'title': f'Profile {report.id}: {report.method} {report.path}',
+        'report': report,
+        'queries': sorted(report.queries, key=lambda query: -query[2]),
+    }
+    return TemplateResponse(request, 'admin/profiles/detail.html', context)